@@ -0,0 +1,152 @@
+"""
+検索結果を列ごとに詰めて持つ ResultSet。
+
+単体のブラウザ (kks_voices_gui.py) がページの行を持つのに使う。
+KKS Voice Studio 本体を読み込まずに済むよう、標準ライブラリだけに依存する。
+"""
+
+from array import array
+from collections.abc import Mapping
+
+# 種類の少ない列。値を共有して行は番号で持つ
+CATEGORY_COLUMNS = {"chara", "mode_name", "level_name", "file_type", "insert_type",
+                    "houshi_type", "aibu_type", "situation_type", "breath_type"}
+
+
+class _CategoryColumn:
+    """種類の少ない列 (キャラ・モード・レベル・種別)。値は 1 度だけ持ち、行は番号で持つ。"""
+
+    def __init__(self):
+        self._codes  = array("I")
+        self._values = []
+        self._index  = {}
+
+    def append(self, v):
+        code = self._index.get(v)
+        if code is None:
+            code = self._index[v] = len(self._values)
+            self._values.append(v)
+        self._codes.append(code)
+
+    def get(self, i: int):
+        return self._values[self._codes[i]]
+
+
+class _ValueColumn:
+    """それ以外の列。整数は array、文字列は UTF-8 の連結バッファに詰め、読むときに decode する。
+
+    整数と文字列が混ざるなど詰められない値が来たら、以降は普通のリストで持つ。
+    """
+
+    def __init__(self):
+        self._kind  = None           # None (まだ NULL だけ) / "int" / "text" / "obj"
+        self._nulls = bytearray()
+        self._ints  = array("q")
+        self._blob  = bytearray()
+        self._offs  = array("Q", [0])
+        self._objs  = None
+
+    def __len__(self):
+        return len(self._nulls)
+
+    def append(self, v):
+        kind = self._kind
+        if v is not None and kind != "obj":
+            want = "int" if type(v) is int else "text" if type(v) is str else "obj"
+            if kind is None and want != "obj":
+                kind = self._kind = want
+            elif want != kind:
+                self._to_objects()
+                kind = "obj"
+        if kind == "obj":
+            self._objs.append(v)
+            self._nulls.append(0)
+            return
+        self._nulls.append(v is None)
+        if kind == "int":
+            self._ints.append(0 if v is None else v)
+        elif kind == "text":
+            if v is not None:
+                self._blob += v.encode("utf-8")
+            self._offs.append(len(self._blob))
+        else:
+            # 型が決まるまでは両方の位置を進めておく
+            self._ints.append(0)
+            self._offs.append(len(self._blob))
+
+    def get(self, i: int):
+        if self._kind == "obj":
+            return self._objs[i]
+        if self._nulls[i]:
+            return None
+        if self._kind == "int":
+            return self._ints[i]
+        return self._blob[self._offs[i]:self._offs[i + 1]].decode("utf-8")
+
+    def _to_objects(self):
+        objs = [self.get(i) for i in range(len(self))]
+        self._kind, self._objs = "obj", objs
+        self._ints, self._blob, self._offs = array("q"), bytearray(), array("Q", [0])
+
+
+class ResultRow(Mapping):
+    """ResultSet の 1 行を dict のように読むビュー。値は参照されたときに取り出す。"""
+
+    __slots__ = ("_rs", "_i")
+
+    def __init__(self, rs, i: int):
+        self._rs = rs
+        self._i  = i
+
+    def __getitem__(self, key):
+        return self._rs.value(self._i, key)
+
+    def __iter__(self):
+        return iter(self._rs.columns)
+
+    def __len__(self):
+        return len(self._rs.columns)
+
+
+class ResultSet:
+    """検索結果を列ごとに詰めて持つ読み取り専用のシーケンス。
+
+    rs[i] は dict 代わりの ResultRow を返す。行ごとの dict (キー文字列の重複) を持たない
+    ので、大きな結果でも 1 行あたりのオーバーヘッドが小さい。
+    """
+
+    def __init__(self, columns, rows=()):
+        self.columns = list(columns)
+        self._pos    = {c: i for i, c in enumerate(self.columns)}
+        self._cols   = [_CategoryColumn() if c in CATEGORY_COLUMNS else _ValueColumn()
+                        for c in self.columns]
+        self._len    = 0
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_cursor(cls, cur):
+        return cls([d[0] for d in cur.description], cur)
+
+    def append(self, row):
+        for col, v in zip(self._cols, row):
+            col.append(v)
+        self._len += 1
+
+    def value(self, i: int, key: str):
+        if not 0 <= i < self._len:
+            raise IndexError(i)
+        return self._cols[self._pos[key]].get(i)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError(i)
+        return ResultRow(self, i)
+
+    def __iter__(self):
+        return (ResultRow(self, i) for i in range(self._len))
@@ -4,8 +4,12 @@ KKS Voice Studio
 Tab 1: 抽出   - UnityPy で KKS の AssetBundle から WAV を抽出
 Tab 2: DB構築 - 抽出済み WAV から SQLite DB を構築
 Tab 3: ブラウズ - DB を閲覧・絞り込み・エクスポート
+
+引数付きで起動するとGUIなしのCLIとして動く (python kks_voice_studio.py --help)。
 """
 
+import argparse
+import bisect
 import csv
 import datetime as dt
 import json
@@ -14,9 +18,15 @@ import queue
 import re
 import shutil
 import sqlite3
+import sys
 import threading
+import time
 import tkinter as tk
-from collections import defaultdict
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from itertools import islice
 from pathlib import Path
 from tkinter import filedialog, messagebox, ttk
 
@@ -29,6 +39,9 @@ except ImportError:
 # ── Constants ─────────────────────────────────────────────────────────────────
 
 APP_STATE_PATH = Path(__file__).resolve().with_name("kks_voice_studio_state.json")
+TYPE_MAP_CACHE_PATH = APP_STATE_PATH.with_name("kks_voice_studio_typemaps.json")
+# _build_*_map / _reduce_pattern_tree の出力が変わったら上げる (古いキャッシュを捨てる)
+TYPE_MAP_CACHE_VERSION = 1
 HISTORY_MAX    = 200
 INVALID_FS_CHARS = '<>:"/\\|?*'
 
@@ -67,6 +80,9 @@ COMBO_FILTERS  = ["chara","mode_name","level_name","file_type",
                   "insert_type","houshi_type","aibu_type","situation_type","breath_type"]
 LIKE_FILTERS   = ["filename","serif","wav_path"]
 
+EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+EXTRACT_MANIFEST_NAME = "extract_manifest.json"
+
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
 def _load_char_display_map(kks_dir: str) -> dict:
@@ -179,29 +195,73 @@ _TAG_ORDER = [
 ]
 
 
-def _load_pattern_trees(kks_dir: str, log_fn) -> dict:
-    """h/list/*.unity3d から全 VoicePatternData を読み込む。mode → [tree] 辞書を返す。"""
+_PATTERN_KEY_RE = re.compile(r"voice_0([0-46])_00")
+
+
+def _reduce_pattern_tree(tree: dict) -> dict:
+    """型マップ構築で参照する param[].id / lstInfo[] の 3 リストだけを残す。"""
+    return {"param": [
+        {"id": param.get("id", -1),
+         "lstInfo": [{"lstConditions":  li.get("lstConditions", []),
+                      "lstVoice":       li.get("lstVoice", []),
+                      "lstSecondVoice": li.get("lstSecondVoice", [])}
+                     for li in param.get("lstInfo", [])]}
+        for param in tree.get("param", [])
+    ]}
+
+
+def _read_pattern_bundle(bundle_path: str) -> dict:
+    """1 バンドル内の voice_0X_00 だけを読み、縮約した木を mode 別に返す (ワーカー用)。
+
+    読めなかったコンテナは warnings に残す (型マップが欠けるのでキャッシュさせない)。
+    """
+    result = {"bundle": bundle_path, "trees": {}, "warnings": [], "error": None}
+    try:
+        env = UnityPy.load(bundle_path)
+        for key in env.container:
+            m = _PATTERN_KEY_RE.search(key)
+            if not m:
+                continue
+            try:
+                tree = env.container[key].read_typetree()
+            except Exception as e:
+                result["warnings"].append(f"{key}: {e}")
+                continue
+            result["trees"].setdefault(int(m.group(1)), []).append(
+                _reduce_pattern_tree(tree))
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _load_pattern_trees(kks_dir: str, log_fn, workers: int = EXTRACT_WORKERS) -> dict:
+    """h/list/*.unity3d から全 VoicePatternData を読み込む。mode → [tree] 辞書を返す。
+
+    バンドルはプロセスプールで並列に読み、木はワーカー内で必要な列だけに縮約する。
+    """
     h_list = Path(kks_dir) / "abdata" / "h" / "list"
     if not h_list.is_dir():
         log_fn(f"[WARN] {h_list} が見つかりません\n")
         return {}
-    suffixes = {
-        0: "voice_00_00", 1: "voice_01_00", 2: "voice_02_00",
-        3: "voice_03_00", 4: "voice_04_00", 6: "voice_06_00",
-    }
-    result = {m: [] for m in suffixes}
-    for bp in sorted(h_list.glob("*.unity3d")):
-        try:
-            env = UnityPy.load(str(bp))
-            for key in env.container:
-                for mode, suf in suffixes.items():
-                    if suf in key:
-                        try:
-                            result[mode].append(env.container[key].read_typetree())
-                        except Exception:
-                            pass
-        except Exception as e:
-            log_fn(f"[WARN] {bp.name}: {e}\n")
+    result  = {m: [] for m in (0, 1, 2, 3, 4, 6)}
+    bundles = [str(bp) for bp in sorted(h_list.glob("*.unity3d"))]
+    workers = min(workers, len(bundles))
+    if workers <= 1:
+        loaded = map(_read_pattern_bundle, bundles)
+    else:
+        pool   = ProcessPoolExecutor(max_workers=workers)
+        loaded = pool.map(_read_pattern_bundle, bundles)
+    try:
+        for res in loaded:
+            if res["error"]:
+                log_fn(f"[WARN] {Path(res['bundle']).name}: {res['error']}\n")
+            for w in res["warnings"]:
+                log_fn(f"[WARN] {Path(res['bundle']).name}: {w}\n")
+            for mode, trees in res["trees"].items():
+                result[mode].extend(trees)
+    finally:
+        if workers > 1:
+            pool.shutdown()
     return result
 
 
@@ -281,14 +341,239 @@ def _build_situation_map(trees: list, tag_dict: dict) -> dict:
         result[vid] = "/".join(sorted(tags, key=lambda t: _TAG_ORDER.index(t) if t in _TAG_ORDER else 99))
     return result
 
+# ── 抽出エンジン ──────────────────────────────────────────────────────────────
+
+def _clip_name(obj) -> tuple:
+    """AudioClip の m_Name をサンプルのデコード無しで取得する。
+
+    (名前, 読み込み済みのクリップ) を返す。peek_name が使えず read() で名前を得た
+    場合はその結果を返し、呼び出し側で同じクリップを 2 回パースしないようにする。
+    """
+    peek = getattr(obj, "peek_name", None)  # UnityPy 1.10+
+    if peek is not None:
+        try:
+            name = peek()
+            if name:
+                return name, None
+        except Exception:
+            pass
+    clip = obj.read()
+    return clip.m_Name, clip
+
+
+def _clip_selected(name: str, type_codes=None, levels=None) -> bool:
+    """クリップ名が型コード / レベルの抽出フィルタに一致するか。None は無条件。"""
+    if type_codes is None and levels is None:
+        return True
+    m = FILENAME_RE.match(name + ".wav")
+    if not m:
+        return False
+    type_code, _, level_code, _ = m.groups()
+    return ((type_codes is None or type_code.lower() in type_codes) and
+            (levels is None or level_code in levels))
+
+
+def _extract_bundle(bundle_path: str, char_out: str,
+                    type_codes=None, levels=None) -> dict:
+    """1 バンドル内の AudioClip を WAV に書き出す。プロセスプールのワーカーから呼ばれる。
+
+    先に名前だけを解決し、フィルタに一致して出力が無いクリップだけ samples をデコードする。
+    """
+    result = {"bundle": bundle_path, "count": 0, "clips": [], "error": None}
+    try:
+        env = UnityPy.load(bundle_path)
+        for obj in env.objects:
+            if obj.type.name != "AudioClip":
+                continue
+            name, clip = _clip_name(obj)
+            result["clips"].append(name)
+            if not _clip_selected(name, type_codes, levels):
+                continue
+            out_path = Path(char_out) / (name + ".wav")
+            if out_path.exists():
+                continue
+            for audio_data in (clip or obj.read()).samples.values():
+                out_path.write_bytes(audio_data)
+                result["count"] += 1
+                break
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _bundle_fingerprint(bp: Path) -> dict:
+    st = bp.stat()
+    return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+
+def _load_extract_manifest(out_dir: str) -> dict:
+    """WAV出力先の抽出マニフェスト (bundle_path → size/mtime/clips) を読み込む。"""
+    path = Path(out_dir) / EXTRACT_MANIFEST_NAME
+    if path.exists():
+        try:
+            data = json.loads(path.read_text("utf-8"))
+            if isinstance(data.get("bundles"), dict):
+                return data
+        except Exception:
+            pass
+    return {"version": 1, "bundles": {}}
+
+
+def _save_extract_manifest(out_dir: str, manifest: dict):
+    path = Path(out_dir) / EXTRACT_MANIFEST_NAME
+    tmp  = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _bundle_unchanged(entry, fingerprint: dict, char_out: Path,
+                      type_codes=None, levels=None) -> bool:
+    """マニフェストの記録と size/mtime が一致し、対象 WAV が全て揃っていれば True。"""
+    if not entry or entry.get("size") != fingerprint["size"] \
+            or entry.get("mtime") != fingerprint["mtime"]:
+        return False
+    return all((char_out / (name + ".wav")).exists()
+               for name in entry.get("clips", [])
+               if _clip_selected(name, type_codes, levels))
+
+
+def extract_voices(kks_root: str, out_dir: str, chars: list, log_fn,
+                   is_running=lambda: True, workers: int = EXTRACT_WORKERS,
+                   use_manifest: bool = True, type_codes=None, levels=None,
+                   on_clip=None) -> dict:
+    """選択キャラの h バンドルから WAV を抽出し、件数の集計を返す。
+
+    バンドル 1 個を作業単位としてプロセスプールへ投入する (同時投入は workers*2 まで)。
+    is_running() が False になると未着手の作業単位をキャンセルする。
+    use_manifest が True なら前回から変更がなく出力も揃っているバンドルは読み込まない。
+    type_codes / levels (例: {"so"}, {"03"}) を指定するとクリップ名で絞り込む。
+    on_clip(name, wav_path, size, mtime_ns) は対象クリップの WAV が揃うたびに呼ばれる
+    (スキップしたバンドル・既存ファイルも含む)。
+    """
+    manifest  = _load_extract_manifest(out_dir)
+    bundles_m = manifest["bundles"]
+    units     = []   # (char, bundle_path)
+    remaining = {}   # char → 未完了バンドル数
+    counts    = {}   # char → 抽出ファイル数
+    fingerprints = {}
+    stats = {"files": 0, "bundles": 0, "skipped_bundles": 0, "errors": 0,
+             "stopped": False}
+
+    def emit(char_out: Path, names):
+        for name in names:
+            if not _clip_selected(name, type_codes, levels):
+                continue
+            out_path = char_out / (name + ".wav")
+            try:
+                st = out_path.stat()
+            except OSError:
+                continue
+            on_clip(name, str(out_path), st.st_size, st.st_mtime_ns)
+
+    for char in chars:
+        bundle_dir = Path(kks_root) / "abdata" / "sound" / "data" / "pcm" / char / "h"
+        if not bundle_dir.exists():
+            log_fn(f"[skip] {char}: フォルダなし\n")
+            continue
+        char_out = Path(out_dir) / char
+        char_out.mkdir(parents=True, exist_ok=True)
+        todo, skipped = [], 0
+        for bp in sorted(bundle_dir.glob("*.unity3d")):
+            fp = _bundle_fingerprint(bp)
+            entry = bundles_m.get(str(bp))
+            if use_manifest and _bundle_unchanged(entry, fp, char_out, type_codes, levels):
+                skipped += 1
+                if on_clip:
+                    emit(char_out, entry.get("clips", []))
+                continue
+            fingerprints[str(bp)] = fp
+            todo.append(bp)
+        remaining[char] = len(todo)
+        counts[char]    = 0
+        if skipped:
+            stats["skipped_bundles"] += skipped
+            log_fn(f"  [{char}] 変更なし {skipped} バンドルをスキップ\n")
+        if not todo:
+            log_fn(f"[完了] {char}: 0 ファイル\n")
+        units.extend((char, str(bp)) for bp in todo)
+
+    def collect(char, res):
+        name = Path(res["bundle"]).name
+        stats["bundles"] += 1
+        if res["error"]:
+            stats["errors"] += 1
+            log_fn(f"  [error] {name}: {res['error']}\n")
+        else:
+            log_fn(f"  [{char}] {name}\n")
+            bundles_m[res["bundle"]] = dict(fingerprints[res["bundle"]],
+                                            clips=res["clips"])
+            if on_clip:
+                emit(Path(out_dir) / char, res["clips"])
+        counts[char]    += res["count"]
+        remaining[char] -= 1
+        if remaining[char] == 0:
+            log_fn(f"[完了] {char}: {counts[char]} ファイル\n")
+
+    stopped = False
+    if workers <= 1 or len(units) <= 1:
+        for char, bp in units:
+            if not is_running():
+                stopped = True
+                break
+            collect(char, _extract_bundle(bp, str(Path(out_dir) / char),
+                                          type_codes, levels))
+    else:
+        log_fn(f"[並列] {len(units)} バンドルを {workers} プロセスで処理\n")
+        pending   = iter(units)
+        in_flight = {}   # future → (char, bundle_path)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                while not stopped and len(in_flight) < workers * 2:
+                    unit = next(pending, None)
+                    if unit is None:
+                        break
+                    char, bp = unit
+                    fut = pool.submit(_extract_bundle, bp, str(Path(out_dir) / char),
+                                      type_codes, levels)
+                    in_flight[fut] = unit
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    char, bp = in_flight.pop(fut)
+                    if fut.cancelled():
+                        continue
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        res = {"bundle": bp, "count": 0, "clips": [], "error": str(e)}
+                    collect(char, res)
+                if not stopped and not is_running():
+                    stopped = True
+                    for fut in [f for f in in_flight if f.cancel()]:
+                        del in_flight[fut]
+    if stopped:
+        log_fn("[停止しました]\n")
+    try:
+        _save_extract_manifest(out_dir, manifest)
+    except Exception as e:
+        log_fn(f"[WARN] マニフェスト保存エラー: {e}\n")
+    stats["files"]   = sum(counts.values())
+    stats["stopped"] = stopped
+    log_fn(f"\n── 合計 {stats['files']} ファイル抽出 ──\n")
+    return stats
+
 # ── Extract Tab ───────────────────────────────────────────────────────────────
 
 class ExtractTab(tk.Frame):
-    def __init__(self, parent, on_kks_change=None):
+    def __init__(self, parent, on_kks_change=None, get_db_path=None, on_db_ready=None):
         super().__init__(parent)
         self._log_queue    = queue.Queue()
         self._running      = False
         self._on_kks_change = on_kks_change
+        self._get_db_path  = get_db_path or (lambda: "")
+        self._on_db_ready  = on_db_ready   # callback(db_path: str)
+        self._indexed_db   = None
         self._build_ui()
 
     def _build_ui(self):
@@ -330,6 +615,26 @@ class ExtractTab(tk.Frame):
             w.grid(row=i // 8, column=i % 8, sticky="w")
             self._char_cbs[ch] = w
 
+        # Type / level filter
+        flt = tk.LabelFrame(self, text="種別・レベル選択")
+        flt.pack(fill="x", padx=6, pady=3)
+        type_fr = tk.Frame(flt)
+        type_fr.pack(fill="x")
+        self._type_vars = {}
+        for i, (tc, (jp, _)) in enumerate(TYPE_INFO.items()):
+            var = tk.BooleanVar(value=True)
+            self._type_vars[tc] = var
+            tk.Checkbutton(type_fr, text=f"{tc} {jp}", variable=var, width=14,
+                           anchor="w").grid(row=0, column=i, sticky="w")
+        level_fr = tk.Frame(flt)
+        level_fr.pack(fill="x")
+        self._level_vars = {}
+        for i, (lv, name) in enumerate(LEVEL_NAME.items()):
+            var = tk.BooleanVar(value=True)
+            self._level_vars[lv] = var
+            tk.Checkbutton(level_fr, text=f"{lv} {name}", variable=var, width=14,
+                           anchor="w").grid(row=0, column=i, sticky="w")
+
         # Start / Stop
         ctrl = tk.Frame(self)
         ctrl.pack(fill="x", **pad)
@@ -339,6 +644,16 @@ class ExtractTab(tk.Frame):
         self._stop_btn  = tk.Button(ctrl, text="■ 停止", command=self._stop,
                                     state=tk.DISABLED, width=10)
         self._stop_btn.pack(side="left", padx=2)
+        tk.Label(ctrl, text="並列数:").pack(side="left", padx=(8, 0))
+        self._workers_var = tk.IntVar(value=EXTRACT_WORKERS)
+        tk.Spinbox(ctrl, from_=1, to=64, textvariable=self._workers_var,
+                   width=4).pack(side="left", padx=2)
+        self._incremental_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(ctrl, text="差分抽出(変更なしバンドルをスキップ)",
+                       variable=self._incremental_var).pack(side="left", padx=6)
+        self._index_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(ctrl, text="抽出と同時にDB登録",
+                       variable=self._index_var).pack(side="left", padx=6)
         self._status_var = tk.StringVar(value="待機中")
         tk.Label(ctrl, textvariable=self._status_var).pack(side="left", padx=8)
 
@@ -381,6 +696,11 @@ class ExtractTab(tk.Frame):
             "kks_dir": self._kks_var.get(),
             "out_dir": self._out_var.get(),
             "chars": {k: v.get() for k, v in self._char_vars.items()},
+            "workers": self._workers_var.get(),
+            "incremental": self._incremental_var.get(),
+            "index_db": self._index_var.get(),
+            "types":  {k: v.get() for k, v in self._type_vars.items()},
+            "levels": {k: v.get() for k, v in self._level_vars.items()},
         }
 
     def apply_settings(self, d):
@@ -396,6 +716,18 @@ class ExtractTab(tk.Frame):
         for k, v in d.get("chars", {}).items():
             if k in self._char_vars:
                 self._char_vars[k].set(bool(v))
+        if d.get("workers"):
+            self._workers_var.set(int(d["workers"]))
+        if "incremental" in d:
+            self._incremental_var.set(bool(d["incremental"]))
+        if "index_db" in d:
+            self._index_var.set(bool(d["index_db"]))
+        for k, v in d.get("types", {}).items():
+            if k in self._type_vars:
+                self._type_vars[k].set(bool(v))
+        for k, v in d.get("levels", {}).items():
+            if k in self._level_vars:
+                self._level_vars[k].set(bool(v))
 
     def _append_log(self, text: str):
         self._log.config(state=tk.NORMAL)
@@ -412,6 +744,8 @@ class ExtractTab(tk.Frame):
                     self._start_btn.config(state=tk.NORMAL)
                     self._stop_btn.config(state=tk.DISABLED)
                     self._status_var.set("完了")
+                    if self._on_db_ready and self._indexed_db:
+                        self._on_db_ready(self._indexed_db)
                     return
                 self._append_log(item)
         except queue.Empty:
@@ -435,11 +769,30 @@ class ExtractTab(tk.Frame):
         if not chars:
             messagebox.showerror("エラー", "キャラクターを1つ以上選択してください。")
             return
+        types  = [k for k, v in self._type_vars.items() if v.get()]
+        levels = [k for k, v in self._level_vars.items() if v.get()]
+        if not types or not levels:
+            messagebox.showerror("エラー", "種別とレベルを1つ以上選択してください。")
+            return
+        # 全選択ならフィルタ無し (命名規則外のクリップも抽出する)
+        types  = None if len(types)  == len(self._type_vars)  else types
+        levels = None if len(levels) == len(self._level_vars) else levels
+        try:
+            workers = max(1, int(self._workers_var.get()))
+        except (tk.TclError, ValueError):
+            workers = EXTRACT_WORKERS
+            self._workers_var.set(workers)
+        index_db = None
+        if self._index_var.get():
+            index_db = self._get_db_path().strip() or str(Path(out) / "kks_voices.db")
         self._running = True
+        self._indexed_db = None
         self._start_btn.config(state=tk.DISABLED)
         self._stop_btn.config(state=tk.NORMAL)
         self._status_var.set("抽出中...")
-        threading.Thread(target=self._worker, args=(kks, out, chars),
+        threading.Thread(target=self._worker,
+                         args=(kks, out, chars, workers, self._incremental_var.get(),
+                               types, levels, index_db),
                          daemon=True).start()
         self.after(100, self._drain)
 
@@ -447,48 +800,33 @@ class ExtractTab(tk.Frame):
         self._running = False
         self._log_queue.put("[停止要求]\n")
 
-    def _worker(self, kks_root: str, out_dir: str, chars: list):
-        total = 0
-        for char in chars:
-            if not self._running:
-                self._log_queue.put("[停止しました]\n")
-                break
-            bundle_dir = Path(kks_root) / "abdata" / "sound" / "data" / "pcm" / char / "h"
-            if not bundle_dir.exists():
-                self._log_queue.put(f"[skip] {char}: フォルダなし\n")
-                continue
-            char_out = Path(out_dir) / char
-            char_out.mkdir(parents=True, exist_ok=True)
-            count = 0
-            for bp in sorted(bundle_dir.glob("*.unity3d")):
-                if not self._running:
-                    break
-                self._log_queue.put(f"  [{char}] {bp.name}\n")
+    def _worker(self, kks_root: str, out_dir: str, chars: list, workers: int,
+                incremental: bool, types, levels, index_db):
+        indexer = None
+        try:
+            if index_db:
+                indexer = VoiceIndexer(index_db, kks_root, self._log_queue.put)
+            extract_voices(kks_root, out_dir, chars, self._log_queue.put,
+                           is_running=lambda: self._running, workers=workers,
+                           use_manifest=incremental, type_codes=types, levels=levels,
+                           on_clip=indexer.add if indexer else None)
+            if indexer:
+                self._indexed_db = indexer.close()["db_path"]
+                indexer = None
+        except Exception as e:
+            self._log_queue.put(f"[ERROR] {e}\n")
+        finally:
+            if indexer:
                 try:
-                    env = UnityPy.load(str(bp))
-                    for obj in env.objects:
-                        if obj.type.name != "AudioClip":
-                            continue
-                        clip = obj.read()
-                        wav_name = clip.m_Name + ".wav"
-                        out_path = char_out / wav_name
-                        if out_path.exists():
-                            continue
-                        for audio_data in clip.samples.values():
-                            out_path.write_bytes(audio_data)
-                            count += 1
-                            break
-                except Exception as e:
-                    self._log_queue.put(f"  [error] {bp.name}: {e}\n")
-            self._log_queue.put(f"[完了] {char}: {count} ファイル\n")
-            total += count
-        self._log_queue.put(f"\n── 合計 {total} ファイル抽出 ──\n")
-        self._log_queue.put("__done__")
+                    indexer.close()
+                except Exception:
+                    pass
+            self._log_queue.put("__done__")
 
 
 # ── Build DB Tab ──────────────────────────────────────────────────────────────
 
-DB_DDL = """
+DB_TABLES_DDL = """
 CREATE TABLE IF NOT EXISTS voices (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     chara TEXT, mode_name TEXT, voice_id INTEGER,
@@ -496,7 +834,8 @@ CREATE TABLE IF NOT EXISTS voices (
     filename TEXT, file_type TEXT,
     insert_type TEXT, houshi_type TEXT,
     aibu_type TEXT, situation_type TEXT,
-    wav_path TEXT, serif TEXT DEFAULT ''
+    wav_path TEXT, serif TEXT DEFAULT '',
+    wav_size INTEGER, wav_mtime INTEGER
 );
 CREATE TABLE IF NOT EXISTS breaths (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -513,18 +852,568 @@ CREATE TABLE IF NOT EXISTS shortbreaths (
     not_overwrite INTEGER DEFAULT 0,
     wav_path TEXT, serif TEXT DEFAULT ''
 );
+CREATE TABLE IF NOT EXISTS facets (
+    table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+    value TEXT NOT NULL, row_count INTEGER NOT NULL,
+    PRIMARY KEY (table_name, column_name, value)
+) WITHOUT ROWID;
+"""
+# ブラウズのテーブル一覧に出さない内部表
+INTERNAL_TABLES = {"facets"}
+DB_INDEX_DDL = """
 CREATE INDEX IF NOT EXISTS idx_voices_chara     ON voices(chara);
 CREATE INDEX IF NOT EXISTS idx_voices_mode      ON voices(mode_name);
 CREATE INDEX IF NOT EXISTS idx_voices_level     ON voices(level);
 CREATE INDEX IF NOT EXISTS idx_voices_file_type ON voices(file_type);
+CREATE INDEX IF NOT EXISTS idx_voices_wav_path  ON voices(wav_path);
+CREATE INDEX IF NOT EXISTS idx_voices_level_name     ON voices(level_name);
+CREATE INDEX IF NOT EXISTS idx_voices_insert_type    ON voices(insert_type);
+CREATE INDEX IF NOT EXISTS idx_voices_houshi_type    ON voices(houshi_type);
+CREATE INDEX IF NOT EXISTS idx_voices_aibu_type      ON voices(aibu_type);
+CREATE INDEX IF NOT EXISTS idx_voices_situation_type ON voices(situation_type);
+CREATE INDEX IF NOT EXISTS idx_voices_chara_mode_level ON voices(chara, mode_name, level_name);
+CREATE INDEX IF NOT EXISTS idx_voices_type_voice     ON voices(file_type, voice_id);
+CREATE INDEX IF NOT EXISTS idx_voices_voice_id       ON voices(voice_id);
+CREATE INDEX IF NOT EXISTS idx_voices_filename       ON voices(filename);
+CREATE INDEX IF NOT EXISTS idx_voices_serif          ON voices(serif);
+"""
+# PRAGMA user_version: この値以上ならフィルタ列は TRIM 済みで、= 比較でインデックスが使える
+DB_SCHEMA_VERSION = 2
+DB_DDL = DB_TABLES_DDL + DB_INDEX_DDL
+
+# serif / filename の部分一致用 FTS5 (trigram は分かち書きの無い日本語でも 3 文字以上で引ける)。
+# voices を content に持つ外部コンテンツ表で、トリガーで追従させる。
+FTS_TABLE   = "voices_fts"
+FTS_COLUMNS = ["serif", "filename"]
+FTS_MIN_CHARS = 3   # trigram で MATCH できる最小文字数。これ未満は LIKE に回す
+FTS_DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS voices_fts USING fts5(
+    serif, filename, content='voices', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS voices_fts_ai AFTER INSERT ON voices BEGIN
+    INSERT INTO voices_fts(rowid, serif, filename) VALUES (new.id, new.serif, new.filename);
+END;
+CREATE TRIGGER IF NOT EXISTS voices_fts_ad AFTER DELETE ON voices BEGIN
+    INSERT INTO voices_fts(voices_fts, rowid, serif, filename)
+    VALUES ('delete', old.id, old.serif, old.filename);
+END;
+CREATE TRIGGER IF NOT EXISTS voices_fts_au AFTER UPDATE ON voices BEGIN
+    INSERT INTO voices_fts(voices_fts, rowid, serif, filename)
+    VALUES ('delete', old.id, old.serif, old.filename);
+    INSERT INTO voices_fts(rowid, serif, filename) VALUES (new.id, new.serif, new.filename);
+END;
+"""
+
+# 全体再構築用の一時 DB はクラッシュしても捨てるだけなのでジャーナル無しで書く
+BULK_LOAD_PRAGMAS = """
+PRAGMA journal_mode = OFF;
+PRAGMA synchronous = OFF;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -262144;
 """
+BUILD_BATCH_ROWS = 5000
+SCAN_WORKERS     = 8
+
+def _resolve_db_path(db_path: str) -> str:
+    """DB出力先がディレクトリならファイル名を補完する。"""
+    p = Path(db_path)
+    if p.is_dir() or not p.suffix:
+        p = p / "kks_voices.db"
+    return str(p)
+
+
+def _pattern_bundles_fingerprint(h_list: Path) -> list:
+    result = []
+    for bp in sorted(h_list.glob("*.unity3d")):
+        st = bp.stat()
+        result.append([bp.name, st.st_size, st.st_mtime_ns])
+    return result
+
+
+def _read_type_map_cache(h_list: Path, fingerprint: list):
+    """h/list バンドルの path/size/mtime が一致するキャッシュがあれば型マップを返す。"""
+    if not TYPE_MAP_CACHE_PATH.exists():
+        return None
+    try:
+        data = json.loads(TYPE_MAP_CACHE_PATH.read_text("utf-8"))
+        if (data.get("version") != TYPE_MAP_CACHE_VERSION
+                or data.get("h_list") != str(h_list) or data.get("bundles") != fingerprint):
+            return None
+        # JSON のキーは文字列なので voice_id を int に戻す
+        return {name: {int(vid): v for vid, v in m.items()}
+                for name, m in data["maps"].items()}
+    except Exception:
+        return None
+
+
+def _write_type_map_cache(h_list: Path, fingerprint: list, type_maps: dict):
+    try:
+        data = {"version": TYPE_MAP_CACHE_VERSION, "h_list": str(h_list), "bundles": fingerprint,
+                "maps": type_maps}
+        tmp = TYPE_MAP_CACHE_PATH.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(TYPE_MAP_CACHE_PATH)
+    except Exception:
+        pass
+
+
+def _load_type_maps(kks_dir: str, log_fn) -> dict:
+    """VoicePatternData から型マップを構築する。読めない場合は空 dict。
+
+    h/list バンドルが前回から変わっていなければディスクキャッシュを使う。
+    """
+    if not kks_dir:
+        log_fn("[DB] KKSフォルダ未指定 → 型列は空のまま構築\n")
+        return {}
+    h_list = Path(kks_dir) / "abdata" / "h" / "list"
+    if not h_list.is_dir():
+        log_fn("[WARN] KKSフォルダ内に abdata/h/list が見つかりません\n")
+        return {}
+    fingerprint = _pattern_bundles_fingerprint(h_list)
+    type_maps = _read_type_map_cache(h_list, fingerprint)
+    if type_maps is not None:
+        log_fn("[DB] 型マップ: キャッシュを使用 (h/list 変更なし)\n")
+    elif not UNITYPY_OK:
+        log_fn("[WARN] UnityPy が無いため型データを読み込めません → 型列は空\n")
+        return {}
+    else:
+        log_fn("[DB] AssetBundle から型データ読み込み中...\n")
+        warnings = []
+
+        def log_warn(text):
+            warnings.append(text)
+            log_fn(text)
+        try:
+            ptrees = _load_pattern_trees(kks_dir, log_warn)
+            type_maps = {
+                "insert":   _build_insert_map(ptrees.get(3, [])),
+                "houshi":   _build_houshi_map(ptrees.get(2, [])),
+                "aibu":     _build_aibu_map(ptrees.get(1, [])),
+                "sit_0":    _build_situation_map(ptrees.get(0, []), _START_TAGS),
+                "sit_4":    _build_situation_map(ptrees.get(4, []), _MAST_TAGS),
+                "sit_6":    _build_situation_map(ptrees.get(6, []), _LES_TAGS),
+            }
+        except Exception as e:
+            log_fn(f"[WARN] 型データ読み込みエラー: {e}\n")
+            return {}
+        if not warnings:   # 一部のバンドルが読めなかった結果はキャッシュしない
+            _write_type_map_cache(h_list, fingerprint, type_maps)
+    log_fn(
+        f"[DB] 型マップ: insert={len(type_maps['insert'])}, "
+        f"houshi={len(type_maps['houshi'])}, "
+        f"aibu={len(type_maps['aibu'])}, "
+        f"situation={len(type_maps['sit_0'])}\n"
+    )
+    return type_maps
+
+
+def _load_serif_map(kks_dir: str, log_fn) -> dict:
+    """kks_dir/voice_extract/voice_csv/ の CSV からセリフ辞書を構築する。
+
+    キー: WAVファイル名(拡張子あり), 値: セリフ文字列
+    """
+    serif_map = {}
+    csv_dir = Path(kks_dir) / "voice_extract" / "voice_csv" if kks_dir else None
+    if csv_dir and csv_dir.is_dir():
+        csv_files = sorted(csv_dir.glob("c*.csv"))
+        for cp in csv_files:
+            try:
+                with cp.open(encoding="utf-8-sig") as f:
+                    for line in f:
+                        parts = line.rstrip("\n").split("|")
+                        if len(parts) >= 4:
+                            serif_map[parts[0]] = parts[3]
+            except Exception as e:
+                log_fn(f"[WARN] CSV読み込みエラー {cp.name}: {e}\n")
+        log_fn(f"[DB] セリフ辞書: {len(serif_map)}件 ({len(csv_files)}ファイル)\n")
+    else:
+        log_fn("[DB] voice_extract/voice_csv が見つからないため serif は空\n")
+    return serif_map
+
+
+def _resolve_type_columns(type_code: str, voice_id: int, type_maps: dict) -> tuple:
+    """型コードに対応する型マップから (insert, houshi, aibu, situation) を解決する。
+
+    未定義は None → DB NULL
+    """
+    if not type_maps:
+        return None, None, None, None
+    if type_code in ("so", "so3p"):
+        return type_maps["insert"].get(voice_id), None, None, None
+    if type_code in ("hh", "hh3p"):
+        return None, type_maps["houshi"].get(voice_id), None, None
+    if type_code == "ai":
+        return None, None, type_maps["aibu"].get(voice_id), None
+    if type_code in ("ka", "ka3p"):
+        return None, None, None, type_maps["sit_0"].get(voice_id)
+    if type_code == "on":
+        return None, None, None, type_maps["sit_4"].get(voice_id)
+    if type_code == "ko":
+        return None, None, None, type_maps["sit_6"].get(voice_id)
+    return None, None, None, None
+
+
+VOICES_COLUMNS = ("chara", "mode_name", "voice_id", "level", "level_name", "filename",
+                  "file_type", "insert_type", "houshi_type", "aibu_type", "situation_type",
+                  "wav_path", "serif", "wav_size", "wav_mtime")
+VOICES_INSERT_SQL = (f"INSERT INTO voices ({', '.join(VOICES_COLUMNS)}) "
+                     f"VALUES ({','.join('?' * len(VOICES_COLUMNS))})")
+VOICES_UPDATE_SQL = (f"UPDATE voices SET {', '.join(c + ' = ?' for c in VOICES_COLUMNS)} "
+                     f"WHERE id = ?")
+
+
+def _migrate_voices_table(conn):
+    """旧バージョンで作った DB に差分更新用の列を追加する。"""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(voices)")}
+    for col in ("wav_size", "wav_mtime"):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE voices ADD COLUMN {col} INTEGER")
+
+
+def _normalize_filter_columns(conn):
+    """既存行のフィルタ列を TRIM 済みに揃え、user_version に記録する。"""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= DB_SCHEMA_VERSION:
+        return
+    for tbl in ("voices", "breaths", "shortbreaths"):
+        cols = {r[1] for r in conn.execute(f"PRAGMA table_info({tbl})")}
+        for k in COMBO_FILTERS:
+            if k in cols:
+                conn.execute(f"UPDATE {tbl} SET {k} = TRIM({k}) WHERE {k} <> TRIM({k})")
+    conn.execute(f"PRAGMA user_version = {DB_SCHEMA_VERSION}")
+    conn.commit()
+
+
+def _refresh_facets(conn):
+    """フィルタ列ごとの値と件数を facets 表に集計し直す (コンボボックスの候補用)。"""
+    with conn:
+        conn.execute("DELETE FROM facets")
+        for tbl, cols in _table_columns(conn).items():
+            for k in COMBO_FILTERS:
+                if k in cols:
+                    conn.execute(
+                        f"INSERT INTO facets SELECT ?, ?, {k}, COUNT(*) FROM {tbl} "
+                        f"WHERE {k} IS NOT NULL AND {k} <> '' GROUP BY {k}", (tbl, k))
+
+
+def _ensure_fts(conn, log_fn) -> bool:
+    """voices_fts とトリガーを用意する。新規作成時は既存行から索引を作る。
+
+    FTS5 / trigram が使えない SQLite では警告だけ出して False を返す (検索は LIKE のまま)。
+    """
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?",
+                              (FTS_TABLE,)).fetchone()
+        conn.executescript(FTS_DDL)
+        if not exists:
+            conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            conn.commit()
+        return True
+    except sqlite3.OperationalError as e:
+        log_fn(f"[WARN] 全文検索インデックスを作れません (LIKE 検索になります): {e}\n")
+        return False
+
+
+def _strip_or_none(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def _voice_row(parsed: dict, wav_path: str, fn: str, type_maps: dict, serif_map: dict,
+               size: int, mtime: int) -> tuple:
+    """parse_voice_filename の結果から VOICES_COLUMNS 順の行を作る。"""
+    insert_type, houshi_type, aibu_type, situation_type = (
+        _strip_or_none(v) for v in
+        _resolve_type_columns(parsed["type_code"], parsed["voice_id"], type_maps))
+    return (
+        parsed["chara"],
+        parsed["mode_name"],
+        parsed["voice_id"],
+        parsed["level"],
+        parsed["level_name"],
+        parsed["filename"],
+        parsed["file_type"],
+        insert_type, houshi_type,
+        aibu_type,   situation_type,
+        wav_path,
+        serif_map.get(fn, ""),
+        size, mtime,
+    )
+
+
+def _scan_wav_dir(char_dir: str) -> tuple:
+    """char_dir 以下の *.wav を os.scandir で再帰的に集め、(パス順のリスト, エラー) を返す。
+
+    size/mtime は DirEntry.stat() から取る (Windows では列挙時の情報を使うので追加の stat 無し)。
+    読めないサブフォルダは飛ばしてエラーに残し、残りの走査は続ける。
+    """
+    found, errors, stack = [], [], [char_dir]
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(".wav"):
+                        st = entry.stat()
+                        found.append((entry.path, entry.name, st.st_size, st.st_mtime_ns))
+        except OSError as e:
+            errors.append(f"{path}: {e}")
+    found.sort()
+    return found, errors
+
+
+def _norm_wav_path(path: str) -> str:
+    """wav_path の表記をそろえる (Windows では "/" を "\\" に)。走査と VoiceIndexer で共通。"""
+    return str(Path(path))
+
+
+def _timed_scan(char_dir: str) -> tuple:
+    started = time.monotonic()
+    files, errors = _scan_wav_dir(char_dir)
+    return files, errors, (started, time.monotonic())
+
+
+def _busy_seconds(spans: list) -> float:
+    """(開始, 終了) の区間の和集合の長さ。並列に走った走査の実時間を数える。"""
+    total, end = 0.0, None
+    for a, b in sorted(spans):
+        if end is None or a > end:
+            total += b - a
+            end = b
+        elif b > end:
+            total += b - end
+            end = b
+    return total
+
+
+def _iter_wav_files(wav_dir: str, log_fn, workers: int = SCAN_WORKERS):
+    """wav_dir/c*/**/*.wav を (wav_path, ファイル名, size, mtime_ns) で列挙する。
+
+    キャラフォルダごとにスレッドプールで並列に走査し、結果はキャラ順に返す。
+    同時に走査するのは workers フォルダまでで、先読みした結果が溜まり続けないようにする。
+    wav_path は正規化したルートに os.scandir が名前を足したもの (= _norm_wav_path の表記)。
+    速度のログは走査が動いていた時間だけで数え、呼び出し側の DB 書き込みの時間は含めない。
+    """
+    if not os.path.isdir(wav_dir):
+        log_fn(f"[WARN] WAVフォルダが見つかりません: {wav_dir}\n")
+        return
+    with os.scandir(_norm_wav_path(wav_dir)) as it:
+        char_dirs = sorted(e.path for e in it
+                           if e.name.startswith("c") and e.is_dir())
+    spans = []
+    total = 0
+    todo  = iter(char_dirs)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque((d, pool.submit(_timed_scan, d)) for d in islice(todo, workers))
+        while pending:
+            char_dir, fut = pending.popleft()
+            files, errors, span = fut.result()
+            spans.append(span)
+            for d in islice(todo, 1):
+                pending.append((d, pool.submit(_timed_scan, d)))
+            for err in errors:
+                log_fn(f"[WARN] フォルダを読めません: {err}\n")
+            log_fn(f"[{os.path.basename(char_dir)}] {len(files)} ファイル処理中...\n")
+            total += len(files)
+            yield from files
+    elapsed = max(_busy_seconds(spans), 1e-6)
+    log_fn(f"[scan] {len(char_dirs)} フォルダ / {total:,} ファイル / 走査 {elapsed:.2f} 秒 "
+           f"({total / elapsed:,.0f} ファイル/秒)\n")
+
+
+def _replace_db_file(src: str, dst: str, retries: int = 10):
+    """構築済みの src で dst を置き換える。ロック中なら少し待って再試行する。"""
+    for suffix in ("-journal", "-wal", "-shm"):   # 旧 DB の残骸を新 DB に適用させない
+        try:
+            os.remove(dst + suffix)
+        except OSError:
+            pass
+    for i in range(retries):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if i == retries - 1:
+                raise
+            time.sleep(0.3)
+
+
+def build_voice_db(wav_dir: str, db_path: str, kks_dir: str, log_fn,
+                   incremental: bool = False, swap_fn=None) -> dict:
+    """抽出済み WAV フォルダから voices テーブルを構築し、件数の集計を返す。
+
+    incremental が True なら既存行と wav_path + size/mtime で突き合わせ、
+    追加・変更・消滅したファイルの分だけを 1 トランザクションで反映する。
+    False なら隣の一時ファイル (.building) に一括ロードし、インデックス作成と
+    ANALYZE の後に swap_fn(一時ファイル, db_path) で本番 DB と差し替える
+    (既定は _replace_db_file)。差し替えまで既存 DB はそのまま読める。
+    """
+    db_path = _resolve_db_path(db_path)
+    log_fn(f"[DB] 出力先: {db_path}{' (差分更新)' if incremental else ''}\n")
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    if incremental:
+        target = db_path
+        conn = sqlite3.connect(target)
+        conn.executescript(DB_DDL)
+        _migrate_voices_table(conn)
+        _normalize_filter_columns(conn)
+        _ensure_fts(conn, log_fn)
+    else:
+        target = db_path + ".building"
+        if os.path.exists(target):
+            os.remove(target)
+        conn = sqlite3.connect(target)
+        conn.executescript(BULK_LOAD_PRAGMAS)
+        conn.executescript(DB_TABLES_DDL)
+        conn.execute(f"PRAGMA user_version = {DB_SCHEMA_VERSION}")
+    try:
+        type_maps = _load_type_maps(kks_dir, log_fn)
+        serif_map = _load_serif_map(kks_dir, log_fn)
+
+        existing = {}   # wav_path → (id, size, mtime)
+        deletes  = []
+        for row_id, path, size, mtime in conn.execute(
+                "SELECT id, wav_path, wav_size, wav_mtime FROM voices ORDER BY id"):
+            if path in existing:          # 同じ wav_path の重複行は 1 行に寄せる
+                deletes.append((existing[path][0],))
+            existing[path] = (row_id, size, mtime)
+
+        # 走査しながら BUILD_BATCH_ROWS 件ずつ書き込む (全体で 1 トランザクション)
+        inserts, updates = [], []
+        n_inserted = n_updated = total_skip = unchanged = 0
+        started = time.monotonic()
+
+        def flush():
+            nonlocal n_inserted, n_updated
+            conn.executemany(VOICES_INSERT_SQL, inserts)
+            conn.executemany(VOICES_UPDATE_SQL, updates)
+            n_inserted += len(inserts)
+            n_updated  += len(updates)
+            inserts.clear()
+            updates.clear()
+            written = n_inserted + n_updated
+            rate = written / max(time.monotonic() - started, 1e-6)
+            log_fn(f"[DB] {written:,} 件書き込み ({rate:,.0f} 行/秒)\n")
+
+        with conn:
+            for path, fn, size, mtime in _iter_wav_files(wav_dir, log_fn):
+                parsed = parse_voice_filename(fn)
+                if parsed is None:
+                    total_skip += 1
+                    continue
+                old = existing.pop(path, None)
+                if old and old[1] == size and old[2] == mtime:
+                    unchanged += 1
+                    continue
+                row = _voice_row(parsed, path, fn, type_maps, serif_map, size, mtime)
+                if old:
+                    updates.append(row + (old[0],))
+                else:
+                    inserts.append(row)
+                if len(inserts) + len(updates) >= BUILD_BATCH_ROWS:
+                    flush()
+            if inserts or updates:
+                flush()
+            deletes.extend((row_id,) for row_id, _, _ in existing.values())
+            conn.executemany("DELETE FROM voices WHERE id = ?", deletes)
+        log_fn(f"[DB] 追加 {n_inserted} / 更新 {n_updated} / 削除 {len(deletes)} 件を反映\n")
+        _refresh_facets(conn)
+        if not incremental:
+            log_fn("[DB] インデックス作成・ANALYZE 中...\n")
+            conn.executescript(DB_INDEX_DDL)
+            log_fn("[DB] 全文検索インデックス作成中...\n")
+            _ensure_fts(conn, log_fn)
+            conn.execute("ANALYZE")
+            conn.commit()
+        voices = conn.execute("SELECT COUNT(*) FROM voices").fetchone()[0]
+        conn.close()
+        if not incremental:
+            (swap_fn or _replace_db_file)(target, db_path)
+            log_fn("[DB] 新しい DB に差し替えました\n")
+    except BaseException:
+        conn.close()
+        if not incremental and os.path.exists(target):
+            os.remove(target)
+        raise
+
+    log_fn(
+        f"\n── 完了 ──\n"
+        f"  voices : {voices} 件 (追加 {n_inserted} / 更新 {n_updated} / "
+        f"削除 {len(deletes)} / 変更なし {unchanged})\n"
+        f"  スキップ: {total_skip} 件（名前が不一致）\n"
+        f"  DB出力 : {db_path}\n"
+    )
+    return {"db_path": db_path, "voices": voices, "inserted": n_inserted,
+            "updated": n_updated, "deleted": len(deletes), "unchanged": unchanged,
+            "skipped": total_skip}
+
+
+class VoiceIndexer:
+    """抽出と同時に WAV を voices テーブルへ登録するストリーミング段。
+
+    extract_voices(on_clip=...) から書き出し済みクリップを受け取り、
+    parse_voice_filename → 型マップ解決を行って batch_size 件ずつ INSERT する。
+    同じ wav_path の既存行は置き換えるので、既存 DB への追記にも使える。
+    """
+
+    def __init__(self, db_path: str, kks_dir: str, log_fn, batch_size: int = 2000):
+        self.db_path    = _resolve_db_path(db_path)
+        self._log_fn    = log_fn
+        self._batch_size = batch_size
+        self._batch     = []
+        self.rows       = 0
+        self.skipped    = 0
+        self.bytes      = 0
+        log_fn(f"[DB] 同時登録先: {self.db_path}\n")
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.executescript(DB_DDL)
+        _migrate_voices_table(self._conn)
+        _normalize_filter_columns(self._conn)
+        _ensure_fts(self._conn, log_fn)
+        self._type_maps = _load_type_maps(kks_dir, log_fn)
+        self._serif_map = _load_serif_map(kks_dir, log_fn)
+
+    def add(self, name: str, wav_path: str, size: int, mtime: int):
+        fn = name + ".wav"
+        parsed = parse_voice_filename(fn)
+        if parsed is None:
+            self.skipped += 1
+            return
+        self._batch.append(_voice_row(parsed, _norm_wav_path(wav_path), fn, self._type_maps,
+                                      self._serif_map, size, mtime))
+        self.bytes += size
+        if len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        with self._conn:
+            self._conn.executemany("DELETE FROM voices WHERE wav_path = ?",
+                                   [(r[11],) for r in self._batch])
+            self._conn.executemany(VOICES_INSERT_SQL, self._batch)
+        self.rows += len(self._batch)
+        self._batch = []
+
+    def close(self) -> dict:
+        try:
+            self.flush()
+            _refresh_facets(self._conn)
+        finally:
+            self._conn.close()
+        self._log_fn(
+            f"[DB] 同時登録: voices {self.rows} 件 "
+            f"({self.bytes / 1048576:.1f} MB), スキップ {self.skipped} 件\n")
+        return {"db_path": self.db_path, "voices": self.rows, "skipped": self.skipped}
+
 
 class BuildDbTab(tk.Frame):
-    def __init__(self, parent, on_build_done=None, get_kks_dir=None):
+    def __init__(self, parent, on_build_done=None, get_kks_dir=None, before_swap=None):
         super().__init__(parent)
         self._log_queue   = queue.Queue()
         self._running     = False
         self._on_done     = on_build_done  # callback(db_path: str)
+        self._before_swap = before_swap    # DB 差し替え直前に UI スレッドで呼ぶ
         self._get_kks_dir = get_kks_dir or (lambda: "")
         self._last_db     = None
         self._build_ui()
@@ -555,6 +1444,9 @@ class BuildDbTab(tk.Frame):
         self._build_btn = tk.Button(ctrl, text="▶ DB構築", command=self._start,
                                     bg="#2196F3", fg="white", width=16)
         self._build_btn.pack(side="left", padx=2)
+        self._incremental_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(ctrl, text="差分更新(追加・変更・削除されたWAVだけ反映)",
+                       variable=self._incremental_var).pack(side="left", padx=6)
         self._status_var = tk.StringVar(value="待機中")
         tk.Label(ctrl, textvariable=self._status_var).pack(side="left", padx=8)
 
@@ -583,6 +1475,7 @@ class BuildDbTab(tk.Frame):
         return {
             "wav_dir": self._wav_var.get(),
             "db_path": self._db_var.get(),
+            "incremental": self._incremental_var.get(),
         }
 
     def apply_settings(self, d):
@@ -592,6 +1485,8 @@ class BuildDbTab(tk.Frame):
             self._wav_var.set(d["wav_dir"])
         if d.get("db_path"):
             self._db_var.set(d["db_path"])
+        if "incremental" in d:
+            self._incremental_var.set(bool(d["incremental"]))
 
     def _append_log(self, text: str):
         self._log.config(state=tk.NORMAL)
@@ -603,6 +1498,11 @@ class BuildDbTab(tk.Frame):
         try:
             while True:
                 item = self._log_queue.get_nowait()
+                if isinstance(item, threading.Event):   # 差し替え要求
+                    if self._before_swap:
+                        self._before_swap()
+                    item.set()
+                    continue
                 if item == "__done__":
                     self._running = False
                     self._build_btn.config(state=tk.NORMAL)
@@ -630,179 +1530,777 @@ class BuildDbTab(tk.Frame):
         self._build_btn.config(state=tk.DISABLED)
         self._status_var.set("構築中...")
         threading.Thread(target=self._worker,
-                         args=(wav, db, kks),
+                         args=(wav, db, kks, self._incremental_var.get()),
                          daemon=True).start()
         self.after(100, self._drain)
 
-    def _worker(self, wav_dir: str, db_path: str, kks_dir: str):
+    def _swap_db(self, src: str, dst: str):
+        """ブラウズタブの接続を UI スレッドで閉じてもらってから DB を差し替える。"""
+        released = threading.Event()
+        self._log_queue.put(released)
+        released.wait(timeout=30)
+        _replace_db_file(src, dst)
+
+    def _worker(self, wav_dir: str, db_path: str, kks_dir: str, incremental: bool):
         try:
-            # DB出力先がディレクトリならファイル名を補完
-            p = Path(db_path)
-            if p.is_dir() or not p.suffix:
-                p = p / "kks_voices.db"
-                db_path = str(p)
-            self._last_db = db_path
-            self._log_queue.put(f"[DB] 出力先: {db_path}\n")
-            p.parent.mkdir(parents=True, exist_ok=True)
-            conn = sqlite3.connect(db_path)
-            conn.executescript(DB_DDL)
-            conn.execute("DELETE FROM voices")
-            conn.execute("DELETE FROM breaths")
-            conn.execute("DELETE FROM shortbreaths")
-            conn.commit()
+            self._last_db = _resolve_db_path(db_path)
+            build_voice_db(wav_dir, self._last_db, kks_dir, self._log_queue.put,
+                           incremental=incremental, swap_fn=self._swap_db)
+        except Exception as e:
+            self._log_queue.put(f"[ERROR] {e}\n")
+        finally:
+            self._log_queue.put("__done__")
 
-            # ── VoicePatternData から型マップを構築 ──
-            type_maps = {}
-            if kks_dir and UNITYPY_OK and (Path(kks_dir) / "abdata" / "h" / "list").is_dir():
-                self._log_queue.put("[DB] AssetBundle から型データ読み込み中...\n")
-                try:
-                    ptrees = _load_pattern_trees(kks_dir, self._log_queue.put)
-                    type_maps = {
-                        "insert":   _build_insert_map(ptrees.get(3, [])),
-                        "houshi":   _build_houshi_map(ptrees.get(2, [])),
-                        "aibu":     _build_aibu_map(ptrees.get(1, [])),
-                        "sit_0":    _build_situation_map(ptrees.get(0, []), _START_TAGS),
-                        "sit_4":    _build_situation_map(ptrees.get(4, []), _MAST_TAGS),
-                        "sit_6":    _build_situation_map(ptrees.get(6, []), _LES_TAGS),
-                    }
-                    self._log_queue.put(
-                        f"[DB] 型マップ: insert={len(type_maps['insert'])}, "
-                        f"houshi={len(type_maps['houshi'])}, "
-                        f"aibu={len(type_maps['aibu'])}, "
-                        f"situation={len(type_maps['sit_0'])}\n"
-                    )
-                except Exception as e:
-                    self._log_queue.put(f"[WARN] 型データ読み込みエラー: {e}\n")
-            elif kks_dir:
-                self._log_queue.put("[WARN] KKSフォルダ内に abdata/h/list が見つかりません\n")
-            else:
-                self._log_queue.put("[DB] KKSフォルダ未指定 → 型列は空のまま構築\n")
-
-            # ── CSVからセリフ辞書を構築 (kks_dir/voice_extract/voice_csv/ を自動検索) ──
-            # キー: WAVファイル名(拡張子あり), 値: セリフ文字列
-            serif_map = {}
-            csv_dir = Path(kks_dir) / "voice_extract" / "voice_csv" if kks_dir else None
-            if csv_dir and csv_dir.is_dir():
-                csv_files = sorted(csv_dir.glob("c*.csv"))
-                for cp in csv_files:
-                    try:
-                        with cp.open(encoding="utf-8-sig") as f:
-                            for line in f:
-                                parts = line.rstrip("\n").split("|")
-                                if len(parts) >= 4:
-                                    serif_map[parts[0]] = parts[3]
-                    except Exception as e:
-                        self._log_queue.put(f"[WARN] CSV読み込みエラー {cp.name}: {e}\n")
-                self._log_queue.put(f"[DB] セリフ辞書: {len(serif_map)}件 ({len(csv_files)}ファイル)\n")
-            else:
-                self._log_queue.put("[DB] voice_extract/voice_csv が見つからないため serif は空\n")
 
-            voices_rows = []
-            total_skip  = 0
+# ── Browse Tab ────────────────────────────────────────────────────────────────
 
-            wav_root = Path(wav_dir)
-            char_dirs = sorted(wav_root.glob("c*"))
-            for char_dir in char_dirs:
-                if not char_dir.is_dir():
-                    continue
-                char = char_dir.name
-                wavs = sorted(char_dir.rglob("*.wav"))
-                self._log_queue.put(f"[{char}] {len(wavs)} ファイル処理中...\n")
-                for wav_path in wavs:
-                    fn = wav_path.name
-                    parsed = parse_voice_filename(fn)
-                    if parsed is None:
-                        total_skip += 1
-                        continue
+def fts_match_expr(like_filters: dict):
+    """部分一致フィルタのうち FTS で引けるものを MATCH 式にまとめる。
+
+    (式, 使った列) を返す。FTS_MIN_CHARS 未満の語は trigram で引けないので含めない。
+    """
+    terms, used = [], []
+    for k in FTS_COLUMNS:
+        v = (like_filters.get(k) or "").strip()
+        if len(v) >= FTS_MIN_CHARS:
+            terms.append(f'{k} : "{v.replace(chr(34), chr(34) * 2)}"')
+            used.append(k)
+    return " AND ".join(terms), used
+
+
+def build_where(cols: list, combo_filters: dict, like_filters: dict,
+                normalized: bool = True, fts: str = None):
+    """完全一致 / 部分一致フィルタから WHERE 句とパラメータを組み立てる。
+
+    normalized (フィルタ列が TRIM 済みの DB) なら素の = 比較にしてインデックスを使わせる。
+    fts に全文検索テーブル名を渡すと serif / filename の部分一致を MATCH で引く。
+    """
+    clauses, params = [], []
+    for k in COMBO_FILTERS:
+        v = (combo_filters.get(k) or "").strip()
+        if v and k in cols:
+            clauses.append(f"{k} = ?" if normalized else f"TRIM({k}) = ?")
+            params.append(v)
+    match, fts_cols = fts_match_expr(like_filters) if fts else ("", [])
+    if match:
+        clauses.append(f"rowid IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)")
+        params.append(match)
+    for k in LIKE_FILTERS:
+        v = (like_filters.get(k) or "").strip()
+        if v and k in cols and k not in fts_cols:
+            clauses.append(f"{k} LIKE ?")
+            params.append(f"%{v}%")
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+
+def _order_column(cols: list) -> str:
+    return next((c for c in ["id","idx","voice_id","filename","rowid"]
+                 if c in cols), "rowid")
+
+
+def order_clause(cols: list, sort_col: str = None, desc: bool = False) -> str:
+    """ORDER BY 句。列で並べ替えるときは同じ向きの rowid を付けて順序を一意にする。
+
+    単一列インデックス (列, rowid) を前からも後ろからもそのままなめられるので、
+    SELECT rowid ... ORDER BY はテーブル本体を読まずに済む。
+    """
+    if not sort_col or sort_col not in cols:
+        return _order_column(cols)
+    direction = " DESC" if desc else ""
+    return f"{sort_col}{direction}, rowid{direction}"
+
+
+def _db_normalized(conn) -> bool:
+    return conn.execute("PRAGMA user_version").fetchone()[0] >= DB_SCHEMA_VERSION
+
+
+def _fts_table(conn, tbl: str):
+    """tbl に対応する全文検索テーブルがあればその名前を返す。"""
+    if tbl != "voices":
+        return None
+    found = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?",
+                         (FTS_TABLE,)).fetchone()
+    return FTS_TABLE if found else None
+
+
+def _table_columns(conn) -> dict:
+    """ブラウズ対象のテーブルと列。内部表 (sqlite_* / FTS とその影表) は除く。"""
+    rows = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='table' "
+        "AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+    virtual = [r[0] for r in rows if (r[1] or "").upper().startswith("CREATE VIRTUAL")]
+    tables  = [r[0] for r in rows if r[0] not in INTERNAL_TABLES
+               and not any(r[0] == v or r[0].startswith(v + "_") for v in virtual)]
+    return {t: [r[1] for r in conn.execute(f"PRAGMA table_info({t})")]
+            for t in tables}
+
+
+def load_facets(conn, tbl: str, cols: list, normalized: bool = True) -> dict:
+    """フィルタ列ごとの [(値, 件数), ...] を返す。
+
+    ビルダーが作った facets 表があればそれを読むだけ。無い古い DB では GROUP BY で数える。
+    """
+    facets = {k: [] for k in COMBO_FILTERS if k in cols}
+    has_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'facets'").fetchone()
+    if has_table:
+        cur = conn.execute(
+            "SELECT column_name, value, row_count FROM facets WHERE table_name = ?",
+            (tbl,))
+        for k, v, n in cur:
+            if k in facets:
+                facets[k].append((v, n))
+        if any(facets.values()):
+            return facets
+    for k in facets:
+        col = k if normalized else f"TRIM({k})"
+        facets[k] = [tuple(r) for r in conn.execute(
+            f"SELECT {col}, COUNT(*) FROM {tbl} WHERE {k} IS NOT NULL "
+            f"GROUP BY {col}") if r[0]]
+    return facets
+
+
+def _export_relative_path(tbl: str, row: dict) -> Path:
+    chara = sanitize(str(row.get("chara") or ""))
+    mode_name = row.get("mode_name")
+    mode_seg  = sanitize(str(mode_name)) if mode_name \
+                else f"mode_{row.get('mode','unknown')}"
+    level_name = row.get("level_name")
+    level_seg  = sanitize(str(level_name)) if level_name \
+                 else f"level_{row.get('level','unknown')}"
+    category = (row.get("file_type") or row.get("breath_type") or
+                row.get("houshi_type") or row.get("aibu_type") or
+                row.get("situation_type") or "voice")
+    cat_seg  = sanitize(str(category))
+    src = str(row.get("wav_path") or "")
+    ext = Path(src).suffix if Path(src).suffix else ".wav"
+    fn  = sanitize(str(row.get("filename") or f"id_{row.get('id','unknown')}"))
+    return Path(tbl) / chara / mode_seg / level_seg / cat_seg / f"{fn}{ext}"
+
+
+def _voice_text_row(row: dict) -> list:
+    fn    = str(row.get("filename") or "").strip()
+    if not fn:
+        src = str(row.get("wav_path") or "")
+        fn  = Path(src).name if src else f"id_{row.get('id','unknown')}.wav"
+    if not Path(fn).suffix:
+        fn += ".wav"
+    chara = str(row.get("chara") or "").strip() or "unknown"
+    serif = str(row.get("serif") or "")
+    serif = serif.replace("\r\n", "\n").replace("\r", "\n").replace("\n", " ")
+    return [fn, chara, "JP", serif]
+
+
+def export_rows(rows, tbl: str, exp_dir: str, filter_tag: str,
+                flat: bool = False, save_csv: bool = True) -> dict:
+    """行の wav_path を保存先へコピーし、件数の集計を返す。"""
+    dest_root = Path(exp_dir)
+    if flat:
+        dest_root = dest_root / filter_tag
+    dest_root.mkdir(parents=True, exist_ok=True)
+
+    copied = missing = failed = duplicate_skipped = total = 0
+    voice_text_rows = []
+    seen_sources    = set()
+    seen_dest_paths = set()
+
+    for row in rows:
+        total += 1
+        src = row.get("wav_path")
+        if not src:
+            missing += 1
+            continue
+        src_norm = os.path.normcase(os.path.normpath(str(src)))
+        if src_norm in seen_sources:
+            duplicate_skipped += 1
+            continue
+        rel_norm = os.path.normcase(str(_export_relative_path(tbl, row)))
+        if rel_norm in seen_dest_paths:
+            duplicate_skipped += 1
+            continue
+        if not os.path.isfile(src):
+            missing += 1
+            continue
+        if flat:
+            ext = Path(str(src)).suffix if Path(str(src)).suffix else ".wav"
+            fn  = sanitize(str(row.get("filename") or f"id_{row.get('id','unknown')}"))
+            dst = dest_root / f"{fn}{ext}"
+        else:
+            dst = dest_root / _export_relative_path(tbl, row)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            shutil.copy2(src, dst)
+            copied += 1
+            seen_sources.add(src_norm)
+            seen_dest_paths.add(rel_norm)
+            voice_text_rows.append(_voice_text_row(row))
+        except Exception:
+            failed += 1
+
+    if save_csv and voice_text_rows:
+        stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        vtext_path = dest_root / f"voice_text_{filter_tag}_{stamp}.csv"
+        with vtext_path.open("w", newline="", encoding="utf-8-sig") as f:
+            csv.writer(f, delimiter="|", lineterminator="\n").writerows(voice_text_rows)
+
+    return {"rows": total, "copied": copied, "duplicate_skipped": duplicate_skipped,
+            "missing": missing, "failed": failed, "dest_root": str(dest_root)}
+
+
+def live_facet_counts(conn, tbl: str, cols: list, combo_filters: dict, like_filters: dict,
+                      normalized: bool = True, fts: str = None) -> dict:
+    """フィルタ列ごとに、その列以外の現在の条件で絞った {値: 件数} を返す。
+
+    列ごとに GROUP BY するので、各列のインデックス (+ WHERE 側のインデックス) で数えられる。
+    """
+    counts = {}
+    for k in COMBO_FILTERS:
+        if k not in cols:
+            continue
+        others = dict(combo_filters, **{k: ""})
+        where, params = build_where(cols, others, like_filters, normalized, fts)
+        col = k if normalized else f"TRIM({k})"
+        counts[k] = {r[0]: r[1] for r in conn.execute(
+            f"SELECT {col}, COUNT(*) FROM {tbl} {where} GROUP BY {col}", params)}
+    return counts
+
+
+def _open_readonly(db_path: str):
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class QueryWorker:
+    """読み取り専用の専用接続で DB を別スレッドから読み、結果を Tk スレッドへ返す。
+
+    submit() のたびに世代が進み、古い依頼は実行せずに捨て、実行済みでも結果を配らない。
+    実行中のクエリも progress handler が世代の変化を見て打ち切る (cancel() も同じ)。
+    結果は widget.after のポーリングで on_done(result) / on_error(exc) に渡す。
+    """
+
+    def __init__(self, widget, db_path: str):
+        self._widget   = widget
+        self._db_path  = db_path
+        self._requests = queue.Queue()
+        self._results  = queue.Queue()
+        self._gen      = 0
+        self._running  = None   # 実行中の依頼の世代
+        self._closed   = False
+        self._thread   = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._poll_id  = widget.after(50, self._poll)
+
+    def submit(self, fn, on_done, on_error=None, on_partial=None):
+        """fn(conn) をワーカースレッドで実行する。それより前の依頼は不要になる。
+
+        on_partial を渡すと fn(conn, emit) で呼び、途中結果を emit(x) → on_partial(x) で返せる。
+        """
+        self._gen += 1
+        self._requests.put((self._gen, fn, on_done, on_error, on_partial))
+
+    def cancel(self):
+        """待ち・実行中の依頼をすべて取り消す (結果は配られない)。"""
+        self._gen += 1
+
+    @property
+    def busy(self) -> bool:
+        return self._running is not None or not self._requests.empty()
+
+    def close(self, timeout: float = 2.0):
+        """接続を閉じてスレッドを止める (DB ファイルを差し替える前に呼ぶ)。"""
+        self._closed = True
+        self._gen += 1
+        self._requests.put(None)
+        try:
+            self._widget.after_cancel(self._poll_id)
+        except tk.TclError:
+            pass
+        self._thread.join(timeout)
 
-                    vid = parsed["voice_id"]
-                    tc  = parsed["type_code"]
-
-                    # 型マップから各列を解決 (未定義は None → DB NULL)
-                    if type_maps:
-                        if tc in ("so", "so3p"):
-                            insert_type    = type_maps["insert"].get(vid)
-                            houshi_type    = None
-                            aibu_type      = None
-                            situation_type = None
-                        elif tc in ("hh", "hh3p"):
-                            insert_type    = None
-                            houshi_type    = type_maps["houshi"].get(vid)
-                            aibu_type      = None
-                            situation_type = None
-                        elif tc == "ai":
-                            insert_type    = None
-                            houshi_type    = None
-                            aibu_type      = type_maps["aibu"].get(vid)
-                            situation_type = None
-                        elif tc in ("ka", "ka3p"):
-                            insert_type    = None
-                            houshi_type    = None
-                            aibu_type      = None
-                            situation_type = type_maps["sit_0"].get(vid)
-                        elif tc == "on":
-                            insert_type    = None
-                            houshi_type    = None
-                            aibu_type      = None
-                            situation_type = type_maps["sit_4"].get(vid)
-                        elif tc == "ko":
-                            insert_type    = None
-                            houshi_type    = None
-                            aibu_type      = None
-                            situation_type = type_maps["sit_6"].get(vid)
-                        else:
-                            insert_type = houshi_type = aibu_type = situation_type = None
+    def _run(self):
+        try:
+            conn, open_error = _open_readonly(self._db_path), None
+            # 1000 命令ごとに呼ばれ、新しい依頼や取り消しがあれば True でクエリを中断させる
+            conn.set_progress_handler(lambda: self._running != self._gen, 1000)
+        except sqlite3.Error as e:
+            conn, open_error = None, e
+        try:
+            while True:
+                item = self._requests.get()
+                if item is None:
+                    break
+                gen, fn, on_done, on_error, on_partial = item
+                if gen != self._gen:        # 新しい依頼が来ている
+                    continue
+                self._running = gen
+                try:
+                    if conn is None:
+                        raise open_error
+                    if on_partial:
+                        emit = lambda x, gen=gen: self._results.put(
+                            (gen, on_partial, None, x, None))
+                        result, error = fn(conn, emit), None
                     else:
-                        insert_type = houshi_type = aibu_type = situation_type = None
-
-                    voices_rows.append((
-                        parsed["chara"],
-                        parsed["mode_name"],
-                        parsed["voice_id"],
-                        parsed["level"],
-                        parsed["level_name"],
-                        parsed["filename"],
-                        parsed["file_type"],
-                        insert_type, houshi_type,
-                        aibu_type,   situation_type,
-                        str(wav_path),
-                        serif_map.get(fn, ""),
-                    ))
-
-            self._log_queue.put(f"[DB] {len(voices_rows)} 件 INSERT 中...\n")
-            conn.executemany("""
-                INSERT INTO voices
-                    (chara, mode_name, voice_id, level, level_name, filename,
-                     file_type, insert_type, houshi_type, aibu_type, situation_type,
-                     wav_path, serif)
-                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
-            """, voices_rows)
-            conn.commit()
-            conn.close()
-
-            self._log_queue.put(
-                f"\n── 完了 ──\n"
-                f"  voices : {len(voices_rows)} 件\n"
-                f"  スキップ: {total_skip} 件（名前が不一致）\n"
-                f"  DB出力 : {db_path}\n"
-            )
-        except Exception as e:
-            self._log_queue.put(f"[ERROR] {e}\n")
+                        result, error = fn(conn), None
+                except Exception as e:
+                    result, error = None, e
+                finally:
+                    self._running = None
+                self._results.put((gen, on_done, on_error, result, error))
         finally:
-            self._log_queue.put("__done__")
+            if conn is not None:
+                conn.close()
+
+    def _poll(self):
+        while True:
+            try:
+                gen, on_done, on_error, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if gen != self._gen:
+                continue
+            if error is None:
+                on_done(result)
+            elif on_error:
+                on_error(error)
+        if not self._closed:
+            self._poll_id = self._widget.after(50, self._poll)
+
+
+def search_rowids(conn, tbl: str, where: str, params: list, order: str,
+                  emit=None, within_prev: bool = False):
+    """条件に合う rowid を表示順に array で返す。
+
+    emit を渡すと先頭 FIRST_PAGE_ROWS 件を先に emit(ids) してから全件を読む。
+    within_prev なら前回の結果 (temp.browse_prev) の中だけを探す。
+    """
+    if within_prev:
+        clause = "rowid IN (SELECT rid FROM temp.browse_prev)"
+        where  = f"{where} AND {clause}" if where else f"WHERE {clause}"
+    sql = f"SELECT rowid FROM {tbl} {where} ORDER BY {order}"
+    if emit:
+        first = array("q", (r[0] for r in conn.execute(
+            f"{sql} LIMIT {FIRST_PAGE_ROWS}", params)))
+        if len(first) < FIRST_PAGE_ROWS:
+            return first
+        emit(first)
+    return array("q", (r[0] for r in conn.execute(sql, params)))
+
+
+def _remember_rowids(conn, ids):
+    """次の絞り込み検索で使えるよう、結果の rowid を接続の一時表に残す。"""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS browse_prev (rid INTEGER PRIMARY KEY)")
+    with conn:
+        conn.execute("DELETE FROM temp.browse_prev")
+        conn.executemany("INSERT INTO temp.browse_prev VALUES (?)", ((i,) for i in ids))
+
+
+def _refines(prev, new) -> bool:
+    """new の結果が必ず prev の結果に含まれるか (部分一致の語を書き足しただけか)。"""
+    if prev is None or prev[:3] != new[:3]:
+        return False
+    return all(p in n for p, n in zip(prev[3], new[3]))
+
+
+def db_generation(db_path: str, conn) -> tuple:
+    """DB の中身が変わると変わる値。再構築 (差し替え) はファイルの mtime/サイズ、
+    他の接続からの書き込みは PRAGMA data_version で分かる。"""
+    st = os.stat(db_path)
+    return (os.path.normcase(os.path.abspath(db_path)), st.st_mtime_ns, st.st_size,
+            conn.execute("PRAGMA data_version").fetchone()[0])
+
+
+class ResultCache:
+    """検索結果 (rowid の array) の LRU キャッシュ。合計バイト数で上限を決める。
+
+    キーは (DB 世代, テーブル, WHERE, パラメータ, 並び順)。件数は len(ids)。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes     = 0
+        self._entries  = OrderedDict()
+
+    @staticmethod
+    def _size(ids) -> int:
+        return ids.itemsize * len(ids) + 64
+
+    def get(self, key):
+        ids = self._entries.get(key)
+        if ids is not None:
+            self._entries.move_to_end(key)
+        return ids
+
+    def put(self, key, ids):
+        size = self._size(ids)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= self._size(old)
+        self._entries[key] = ids
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, dropped = self._entries.popitem(last=False)
+            self.bytes -= self._size(dropped)
 
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+
+FACET_CACHE_MAX = 64   # フィルタ条件ごとの件数キャッシュの上限
+RESULT_CACHE_BYTES = 64 * 1024 * 1024   # 検索結果キャッシュの上限 (rowid 800 万件分)
+FIRST_PAGE_ROWS = 100  # 件数より先に返す先頭の行数
+SEARCH_DEBOUNCE_MS = 300
+# これより多い結果は絞り込みの元として一時表に残さない (打鍵ごとの全件書き込みを避ける)
+REFINE_MAX_ROWS = 20000
+GRID_PREFETCH   = 100  # 表示範囲の前後に先読みしておく行数
+EXPORT_FETCH_ROWS = 500   # エクスポート時に 1 回で DB から読む行数
+
+
+class Selection:
+    """結果中の位置の選択を、重ならない半開区間 [start, stop) の並びで持つ。
+
+    全選択は区間 1 つで済み、行やウィジェットのアイテムを作らない。
+    """
+
+    def __init__(self):
+        self._ranges = []
+
+    def clear(self):
+        self._ranges = []
+
+    def set_all(self, count: int):
+        self._ranges = [(0, count)] if count > 0 else []
+
+    def add(self, pos: int):
+        self.add_range(pos, pos + 1)
+
+    def add_range(self, start: int, stop: int):
+        if start >= stop:
+            return
+        kept = []
+        for a, b in self._ranges:
+            if b < start or a > stop:      # 離れている区間はそのまま
+                kept.append((a, b))
+            else:                          # 重なる・接する区間は併合する
+                start, stop = min(start, a), max(stop, b)
+        bisect.insort(kept, (start, stop))
+        self._ranges = kept
+
+    def remove_range(self, start: int, stop: int):
+        if start >= stop:
+            return
+        kept = []
+        for a, b in self._ranges:
+            if b <= start or a >= stop:
+                kept.append((a, b))
+                continue
+            if a < start:
+                kept.append((a, start))
+            if b > stop:
+                kept.append((stop, b))
+        self._ranges = kept
+
+    def ranges(self) -> list:
+        return list(self._ranges)
+
+    def __contains__(self, pos: int) -> bool:
+        i = bisect.bisect_right(self._ranges, (pos, float("inf"))) - 1
+        return i >= 0 and self._ranges[i][0] <= pos < self._ranges[i][1]
+
+    def __len__(self) -> int:
+        return sum(b - a for a, b in self._ranges)
+
+    def __bool__(self) -> bool:
+        return bool(self._ranges)
+
+    def __iter__(self):
+        for a, b in self._ranges:
+            yield from range(a, b)
+
+
+class VirtualGrid(tk.Frame):
+    """全行を Treeview に入れず、見えている行だけを描く仮想スクロールの表。
+
+    行は fetch_rows(start, stop) で結果中の位置を指定して取り出し (読めないときは None)、表示範囲の前後
+    GRID_PREFETCH 行までだけをキャッシュする (スクロール位置によらずメモリは一定)。
+    Treeview のアイテムは表示行数分だけ使い回し、選択は結果中の位置の区間 (Selection) で持つ。
+    クリック・Ctrl+クリック・Shift+クリックは Selection を直接更新するので、
+    画面外の行の選択も正しく外れ、Shift+クリックは画面外にはみ出す範囲でも選択できる。
+    見出しのクリックは on_sort(列) に渡すだけで、並べ替え自体は呼び出し側が DB で行う。
+    """
+
+    def __init__(self, parent, fetch_rows, on_select=None, on_sort=None):
+        super().__init__(parent)
+        self._fetch_rows = fetch_rows
+        self._on_select  = on_select
+        self._on_sort    = on_sort
+        self._sort       = (None, False)
+        self.count       = 0
+        self.top         = 0
+        self.selected    = Selection()
+        self.focus_pos   = None
+        self.anchor_pos  = None
+        self._n_visible  = 20
+        self._columns    = []
+        self._cache      = {}
+        self._syncing    = False
+        self._tree = ttk.Treeview(self, selectmode="extended", show="headings")
+        self._ysb  = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        xsb = ttk.Scrollbar(self, orient="horizontal", command=self._tree.xview)
+        self._tree.configure(xscrollcommand=xsb.set)
+        xsb.pack(side="bottom", fill="x")
+        self._ysb.pack(side="right", fill="y")
+        self._tree.pack(fill="both", expand=True)
+        self._tree.bind("<Configure>", self._on_resize)
+        self._tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        # クリックは Treeview 既定の処理に任せず Selection を直接書き換える
+        # (既定の処理は画面内の行しか知らないので、画面外の選択が残ってしまう)
+        self._tree.bind("<Button-1>", self._on_click)
+        self._tree.bind("<Control-Button-1>", self._on_ctrl_click)
+        self._tree.bind("<Shift-Button-1>", self._on_shift_click)
+        self._tree.bind("<MouseWheel>",
+                        lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        self._tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self._tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "-page"),
+                          ("<Next>", "page"), ("<Home>", "home"), ("<End>", "end")):
+            self._tree.bind(key, lambda e, step=step: self._on_key(step))
+
+    # ── 外から使う ──
+    def set_columns(self, cols: list, widths: dict):
+        self._columns = list(cols)
+        self._tree["columns"] = self._columns
+        for c in self._columns:
+            self._tree.column(c, width=widths.get(c, 100), minwidth=40, stretch=False)
+        self._update_headings()
+
+    def set_sort(self, col, desc: bool = False):
+        """見出しに並び順の印 (▲/▼) を付ける。"""
+        self._sort = (col, desc)
+        self._update_headings()
+
+    def reset(self, count: int):
+        """結果が入れ替わったときに呼ぶ。先頭に戻り、キャッシュと選択を捨てる。"""
+        self.count     = count
+        self.top       = 0
+        self.focus_pos = None
+        self.anchor_pos = None
+        self.selected.clear()
+        self._cache.clear()
+        self.refresh()
+
+    def set_count(self, count: int):
+        """同じ並びの結果が伸びたとき用。位置・選択・キャッシュはそのまま。"""
+        self.count = count
+        self.refresh()
+
+    def select_all(self):
+        """検索結果の全行を選択する (行は読まない)。"""
+        self.selected.set_all(self.count)
+        self.refresh()
+
+    def scroll_by(self, n: int):
+        self.scroll_to(self.top + n)
+        return "break"
+
+    def scroll_to(self, top: int):
+        top = max(0, min(int(top), self.count - self._n_visible))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def refresh(self):
+        stop = min(self.count, self.top + self._n_visible)
+        self._ensure_cached(self.top, stop)
+        items = self._tree.get_children()
+        n = stop - self.top
+        if len(items) > n:
+            self._tree.delete(*items[n:])
+        for i in range(n):
+            row  = self._cache.get(self.top + i, {})
+            vals = [str(row.get(c, "")) for c in self._columns]
+            if i < len(items):
+                self._tree.item(str(i), values=vals)
+            else:
+                self._tree.insert("", "end", iid=str(i), values=vals)
+        # 表示行の選択を selected に合わせる。これで起きる <<TreeviewSelect>> は無視する
+        self._syncing = True
+        self._tree.selection_set([str(p - self.top) for p in range(self.top, stop)
+                                  if p in self.selected])
+        self.after_idle(self._end_sync)
+        if self.count:
+            self._ysb.set(self.top / self.count, stop / self.count)
+        else:
+            self._ysb.set(0, 1)
+
+    # ── 内部 ──
+    def _update_headings(self):
+        col, desc = self._sort
+        for c in self._columns:
+            mark = (" ▼" if desc else " ▲") if c == col else ""
+            cmd  = (lambda c=c: self._on_sort(c)) if self._on_sort else ""
+            self._tree.heading(c, text=c + mark, command=cmd)
+
+    def _ensure_cached(self, start: int, stop: int):
+        lo, hi = max(0, start - GRID_PREFETCH), min(self.count, stop + GRID_PREFETCH)
+        for pos in [p for p in self._cache if not lo <= p < hi]:
+            del self._cache[pos]
+        missing = [p for p in range(start, stop) if p not in self._cache]
+        if missing:
+            # 足りない範囲を先読み分まで広げて 1 回で読む
+            a = max(lo, missing[0] - GRID_PREFETCH)
+            b = min(hi, missing[-1] + 1 + GRID_PREFETCH)
+            while a in self._cache:
+                a += 1
+            while b - 1 in self._cache:
+                b -= 1
+            self._load(a, b)
+
+    def _load(self, start: int, stop: int):
+        rows = self._fetch_rows(start, stop)
+        if rows is None:   # DB 未接続: 空行を覚えず、接続後に読み直す
+            return
+        for i, row in enumerate(rows):
+            self._cache[start + i] = row
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * self.count)
+        elif args[0] == "scroll":
+            n = int(args[1])
+            self.scroll_by(n * self._n_visible if args[2] == "pages" else n)
+
+    def _on_resize(self, event):
+        style = ttk.Style()
+        try:
+            row_h = int(style.lookup("Treeview", "rowheight") or 20)
+        except (ValueError, tk.TclError):
+            row_h = 20
+        n = max(1, (event.height - row_h - 6) // row_h)   # 見出し 1 行分を除く
+        if n != self._n_visible:
+            self._n_visible = n
+            self.top = max(0, min(self.top, self.count - n))
+            self.refresh()
+
+    def _end_sync(self):
+        self._syncing = False
+
+    def _on_tree_select(self, _event=None):
+        if self._syncing:
+            return
+        self.selected.remove_range(self.top, self.top + len(self._tree.get_children()))
+        for i in self._tree.selection():
+            self.selected.add(self.top + int(i))
+        focus = self._tree.focus()
+        if focus:
+            self.focus_pos = self.anchor_pos = self.top + int(focus)
+        if self._on_select and self.focus_pos is not None:
+            self._on_select(self.focus_pos)
+
+    def _clicked_row(self, event):
+        """クリックされた行の iid。見出しや空白なら None (既定の処理に任せる)。"""
+        if self._tree.identify_region(event.x, event.y) not in ("cell", "tree"):
+            return None
+        return self._tree.identify_row(event.y) or None
+
+    def _on_click(self, event):
+        item = self._clicked_row(event)
+        if item is None:
+            return None
+        pos = self.top + int(item)
+        self.selected.clear()
+        self.selected.add(pos)
+        self.anchor_pos = pos
+        return self._after_click(item, pos)
+
+    def _on_ctrl_click(self, event):
+        item = self._clicked_row(event)
+        if item is None:
+            return None
+        pos = self.top + int(item)
+        if pos in self.selected:
+            self.selected.remove_range(pos, pos + 1)
+        else:
+            self.selected.add(pos)
+        self.anchor_pos = pos
+        return self._after_click(item, pos)
+
+    def _on_shift_click(self, event):
+        item = self._clicked_row(event)
+        if item is None:
+            return None
+        pos = self.top + int(item)
+        anchor = self.anchor_pos if self.anchor_pos is not None else pos
+        self.selected.clear()
+        self.selected.add_range(min(anchor, pos), max(anchor, pos) + 1)
+        return self._after_click(item, pos)
+
+    def _after_click(self, item: str, pos: int):
+        self.focus_pos = pos
+        self.refresh()
+        self._tree.focus(item)
+        self._tree.focus_set()
+        if self._on_select:
+            self._on_select(pos)
+        return "break"
+
+    def _on_key(self, step):
+        if not self.count:
+            return "break"
+        pos = self.focus_pos if self.focus_pos is not None else self.top
+        if step == "home":
+            pos = 0
+        elif step == "end":
+            pos = self.count - 1
+        elif step in ("page", "-page"):
+            pos += self._n_visible if step == "page" else -self._n_visible
+        else:
+            pos += step
+        pos = max(0, min(pos, self.count - 1))
+        if pos < self.top:
+            self.top = pos
+        elif pos >= self.top + self._n_visible:
+            self.top = pos - self._n_visible + 1
+        self.focus_pos = self.anchor_pos = pos
+        self.selected.clear()
+        self.selected.add(pos)
+        self.refresh()
+        self._tree.focus(str(pos - self.top))
+        if self._on_select:
+            self._on_select(pos)
+        return "break"
 
-# ── Browse Tab ────────────────────────────────────────────────────────────────
 
 class BrowseTab(tk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
         self.conn             = None
+        self.db_path          = ""
         self.table_columns    = {}
-        self.current_rows     = []
+        self.normalized       = False   # フィルタ列が TRIM 済みの DB か
+        self.current_ids      = array("q")   # 結果の rowid (表示順)
         self.current_visible  = []
         self.current_where    = ""
         self.current_params   = []
+        self.current_match    = ""      # 詳細欄のハイライト用 MATCH 式
+        self._facets          = {}      # {列: [(値, 全体件数)]}
+        self._facet_cache     = {}      # フィルタ条件 → live_facet_counts の結果
+        self._facet_worker    = None
+        self._facet_after     = None
+        self._facets_loading  = False
+        self._query_worker    = None
+        self._search_after    = None
+        self._refine_state    = {}      # 前回の検索条件 (ワーカースレッドだけが触る)
+        self._result_cache    = ResultCache(RESULT_CACHE_BYTES)
+        self._sort            = (None, False)   # (見出しで選んだ列, 降順か)
+        self._quiet_filters   = False   # コードからフィルタを書き換え中 (入力扱いしない)
+        self.current_table    = ""
+        self._showing_partial = False
         self.app_state        = {"last": None, "history": []}
         self.history_win      = None
         self.history_list     = None
@@ -847,6 +2345,8 @@ class BrowseTab(tk.Frame):
         self._combo_vars = {k: tk.StringVar() for k in COMBO_FILTERS}
         self._like_vars  = {k: tk.StringVar() for k in LIKE_FILTERS}
         self._combo_widgets = {}
+        self._combo_labels  = {k: {} for k in COMBO_FILTERS}   # 表示ラベル → 値
+        self._zero_labels   = {k: set() for k in COMBO_FILTERS}  # 0 件になるラベル
         self._like_widgets  = {}
 
         row1 = tk.Frame(filt_lf)
@@ -856,8 +2356,10 @@ class BrowseTab(tk.Frame):
             fr.pack(side="left", padx=3)
             tk.Label(fr, text=k, font=("", 8)).pack()
             cb = ttk.Combobox(fr, textvariable=self._combo_vars[k],
-                              state="readonly", width=14)
+                              state="readonly", width=14,
+                              postcommand=lambda k=k: self.after_idle(self._grey_out, k))
             cb.pack()
+            cb.bind("<<ComboboxSelected>>", lambda e: self._on_filter_edit())
             self._combo_widgets[k] = cb
 
         row2 = tk.Frame(filt_lf)
@@ -868,33 +2370,35 @@ class BrowseTab(tk.Frame):
             tk.Label(fr, text=f"{k}含む", font=("", 8)).pack()
             e = tk.Entry(fr, textvariable=self._like_vars[k], width=20)
             e.pack()
+            self._like_vars[k].trace_add(
+                "write", lambda *a: None if self._quiet_filters else self._on_filter_edit())
             self._like_widgets[k] = e
 
         btns = tk.Frame(filt_lf)
         btns.pack(fill="x", pady=2)
         tk.Button(btns, text="検索", command=self._search,
                   bg="#4CAF50", fg="white", width=10).pack(side="left", padx=4)
+        self._cancel_btn = tk.Button(btns, text="中止", command=self._cancel_query,
+                                     width=6, state=tk.DISABLED)
+        self._cancel_btn.pack(side="left", padx=2)
         tk.Button(btns, text="クリア", command=self._clear_filters,
                   width=8).pack(side="left", padx=2)
         tk.Button(btns, text="履歴", command=self._open_history,
                   width=8).pack(side="left", padx=2)
+        self._live_facets_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(btns, text="候補の件数を条件に連動",
+                       variable=self._live_facets_var,
+                       command=self._schedule_facets).pack(side="left", padx=8)
+        self._live_search_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(btns, text="入力しながら検索",
+                       variable=self._live_search_var).pack(side="left", padx=4)
 
         # Tree + Detail
         pane = tk.PanedWindow(self, orient="vertical", sashwidth=6)
         pane.pack(fill="both", expand=True, padx=6, pady=3)
 
-        tree_fr = tk.Frame(pane)
-        pane.add(tree_fr, height=320)
-        self._tree = ttk.Treeview(tree_fr, selectmode="extended")
-        xsb = ttk.Scrollbar(tree_fr, orient="horizontal",
-                             command=self._tree.xview)
-        ysb = ttk.Scrollbar(tree_fr, orient="vertical",
-                             command=self._tree.yview)
-        self._tree.configure(xscrollcommand=xsb.set, yscrollcommand=ysb.set)
-        xsb.pack(side="bottom", fill="x")
-        ysb.pack(side="right",  fill="y")
-        self._tree.pack(fill="both", expand=True)
-        self._tree.bind("<<TreeviewSelect>>", self._on_select)
+        self._grid = VirtualGrid(pane, self._fetch_window, self._on_select, self._on_sort)
+        pane.add(self._grid, height=320)
 
         det_fr = tk.Frame(pane)
         pane.add(det_fr, height=120)
@@ -904,6 +2408,7 @@ class BrowseTab(tk.Frame):
         self._detail.configure(yscrollcommand=det_sb.set)
         det_sb.pack(side="right", fill="y")
         self._detail.pack(fill="both", expand=True)
+        self._detail.tag_configure("hit", background="#FFEB3B")
 
         # Export buttons
         exp_fr = tk.Frame(self)
@@ -947,16 +2452,20 @@ class BrowseTab(tk.Frame):
         try:
             if self.conn:
                 self.conn.close()
+            self._close_workers()
             self.conn = sqlite3.connect(db_path)
             self.conn.row_factory = sqlite3.Row
-            self.table_columns = {}
-            cur = self.conn.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-            tables = [r[0] for r in cur]
-            for t in tables:
-                cols = [r[1] for r in
-                        self.conn.execute(f"PRAGMA table_info({t})")]
-                self.table_columns[t] = cols
+            self._facet_worker = QueryWorker(self, db_path)
+            self._query_worker = QueryWorker(self, db_path)
+            self._refine_state = {}
+            self.db_path       = db_path
+            self._facet_cache.clear()
+            # 結果は rowid だけなので別の DB (再構築で振り直された rowid) では引けない
+            had_result = bool(self.current_table)
+            self._clear_result()
+            self.table_columns = _table_columns(self.conn)
+            self.normalized    = _db_normalized(self.conn)
+            tables = list(self.table_columns)
             self._tbl_combo["values"] = tables
             if "voices" in tables:
                 self._tbl_var.set("voices")
@@ -964,9 +2473,30 @@ class BrowseTab(tk.Frame):
                 self._tbl_var.set(tables[0])
             self._on_table_changed()
             self._status_var.set(f"接続: {Path(db_path).name}")
+            if had_result:
+                self._run_query()
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def _clear_result(self):
+        self._showing_partial = False
+        self.current_table  = ""
+        self.current_where  = ""
+        self.current_params = []
+        self.current_match  = ""
+        self.current_ids    = array("q")
+        self._total_var.set("0件")
+        self._grid.reset(0)
+
+    def disconnect(self):
+        """DB ファイルを差し替えられるよう接続を閉じる (表示中の結果は残す)。"""
+        self._close_workers()
+        self._result_cache.clear()
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+            self._status_var.set("切断: DB 再構築中")
+
     def _on_table_changed(self):
         self._refresh_filter_state()
         self._load_distinct_values()
@@ -981,228 +2511,363 @@ class BrowseTab(tk.Frame):
         for k, w in self._like_widgets.items():
             w.config(state=tk.NORMAL if k in cols else tk.DISABLED)
             if k not in cols:
-                self._like_vars[k].set("")
+                self._set_filter_quietly(self._like_vars[k], "")
+
+    def _set_filter_quietly(self, var, value):
+        """trace の入力しながら検索を起こさずにフィルタ欄へ値を入れる。"""
+        self._quiet_filters = True
+        try:
+            var.set(value)
+        finally:
+            self._quiet_filters = False
 
     def _load_distinct_values(self):
-        if not self.conn:
+        if not (self.conn and self._facet_worker):
             return
         tbl  = self._tbl_var.get()
         cols = self.table_columns.get(tbl, [])
-        for k in COMBO_FILTERS:
-            if k not in cols:
-                continue
-            cur = self.conn.execute(
-                f"SELECT DISTINCT TRIM({k}) FROM {tbl} WHERE {k} IS NOT NULL "
-                f"ORDER BY TRIM({k})")
-            if k == "chara":
-                vals = [""] + sorted({
-                    self._char_display_map.get(r[0], r[0])
-                    for r in cur if r[0]
-                })
-            else:
-                vals = [""] + sorted({r[0] for r in cur if r[0]})
-            self._combo_widgets[k]["values"] = vals
+        normalized = self.normalized
+
+        def done(facets):
+            self._facets_loading = False
+            self._facets = facets
+            self._apply_facet_counts({})
+            self._schedule_facets()
+
+        def failed(e):
+            self._facets_loading = False
+            self._status_var.set(f"候補の読み込みに失敗: {e}")
+
+        # facets 表の無い古い DB では GROUP BY になるので別スレッドで読む
+        self._facets_loading = True
+        self._facet_worker.submit(
+            lambda conn: load_facets(conn, tbl, cols, normalized), done, failed)
+
+    def _apply_facet_counts(self, live: dict):
+        """候補ラベルを作り直す。live にある列は現在の条件での件数を表示する。"""
+        for k, base in self._facets.items():
+            raw    = self._combo_raw(k)
+            counts = live.get(k)
+            labels, zero = {}, set()
+            for v, n in base:
+                if counts is not None:
+                    n = counts.get(v, 0)
+                label = f"{self._combo_display(k, v)} ({n:,})"
+                labels[label] = v
+                if not n:
+                    zero.add(label)
+            self._combo_labels[k] = labels
+            self._zero_labels[k]  = zero
+            self._combo_widgets[k]["values"] = [""] + sorted(labels)
+            self._combo_vars[k].set(self._combo_label(k, raw))
+
+    def _grey_out(self, k: str):
+        """開いたドロップダウンで 0 件になる候補を灰色にする。"""
+        cb = self._combo_widgets[k]
+        try:
+            lb = f"{self.tk.call('ttk::combobox::PopdownWindow', cb)}.f.l"
+            for i, label in enumerate(cb["values"]):
+                self.tk.call(lb, "itemconfigure", i, "-foreground",
+                             "#9E9E9E" if label in self._zero_labels[k] else "black")
+        except tk.TclError:
+            pass
+
+    # ── Live facets ──
+    def _schedule_facets(self):
+        if self._facet_after:
+            self.after_cancel(self._facet_after)
+        self._facet_after = self.after(250, self._refresh_facets)
+
+    def _refresh_facets(self):
+        self._facet_after = None
+        if not (self.conn and self._facet_worker) or self._facets_loading:
+            return
+        if not self._live_facets_var.get():
+            self._apply_facet_counts({})
+            return
+        tbl   = self._tbl_var.get()
+        cols  = self.table_columns.get(tbl, [])
+        combo = {k: self._combo_raw(k) for k in COMBO_FILTERS}
+        like  = {k: v.get().strip() for k, v in self._like_vars.items()}
+        key   = json.dumps([tbl, combo, like], ensure_ascii=False, sort_keys=True)
+        if key in self._facet_cache:
+            self._apply_facet_counts(self._facet_cache[key])
+            return
+        fts, normalized = _fts_table(self.conn, tbl), self.normalized
+
+        def done(counts):
+            if len(self._facet_cache) >= FACET_CACHE_MAX:
+                self._facet_cache.pop(next(iter(self._facet_cache)))
+            self._facet_cache[key] = counts
+            self._apply_facet_counts(counts)
+
+        self._facet_worker.submit(
+            lambda conn: live_facet_counts(conn, tbl, cols, combo, like, normalized, fts),
+            done, lambda e: self._status_var.set(f"件数の集計に失敗: {e}"))
+
+    def _close_workers(self):
+        for worker in (self._facet_worker, self._query_worker):
+            if worker:
+                worker.close()
+        self._facet_worker = self._query_worker = None
+        self._facets_loading = False
+        self._set_busy(False)
+
+    def _combo_display(self, k: str, raw: str) -> str:
+        return self._char_display_map.get(raw, raw) if k == "chara" else raw
+
+    def _combo_raw(self, k: str) -> str:
+        """コンボボックスの表示 ("c13 ギャル (1,234)" など) から DB の値を得る。"""
+        v = self._combo_vars[k].get().strip()
+        if v in self._combo_labels[k]:
+            return self._combo_labels[k][v]
+        if v and k == "chara":
+            v = v.split()[0]  # "c13 ギャル" → "c13"
+        return v
+
+    def _combo_label(self, k: str, raw: str) -> str:
+        if not raw:
+            return ""
+        for label, v in self._combo_labels[k].items():
+            if v == raw:
+                return label
+        return self._combo_display(k, raw)
 
     def _build_where(self):
+        """(WHERE 句, パラメータ, 詳細欄のハイライト用 MATCH 式) を返す。"""
         tbl  = self._tbl_var.get()
         cols = self.table_columns.get(tbl, [])
-        clauses, params = [], []
-        for k in COMBO_FILTERS:
-            v = self._combo_vars[k].get().strip()
-            if v and k in cols:
-                if k == "chara":
-                    v = v.split()[0]  # "c13 ギャル" → "c13"
-                clauses.append(f"TRIM({k}) = ?")
-                params.append(v)
-        for k in LIKE_FILTERS:
-            v = self._like_vars[k].get().strip()
-            if v and k in cols:
-                clauses.append(f"{k} LIKE ?")
-                params.append(f"%{v}%")
-        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
-        return where, params
+        combo = {k: self._combo_raw(k) for k in COMBO_FILTERS}
+        like = {k: v.get() for k, v in self._like_vars.items()}
+        fts  = _fts_table(self.conn, tbl)
+        match = fts_match_expr(like)[0] if fts else ""
+        return build_where(cols, combo, like, self.normalized, fts) + (match,)
 
     def _search(self):
         self._run_query()
         self._push_history()
         self._save_last()
 
-    def _run_query(self):
-        if not self.conn:
+    def _on_filter_edit(self):
+        self._schedule_facets()
+        if not (self._live_search_var.get() and self.conn):
+            return
+        if self._search_after:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DEBOUNCE_MS, self._live_search)
+
+    def _live_search(self):
+        self._search_after = None
+        self._run_query(live=True)
+
+    def _run_query(self, live: bool = False):
+        """検索を別スレッドに投げる。実行中の検索があれば打ち切って差し替える。
+
+        先頭の 1 画面分を先に表示し、全件 (= 件数) は後から差し替える。
+        live (入力しながら検索) では結果を一時表に残し、語を書き足しただけの
+        次の検索は前回の結果の中だけを探す。
+        """
+        if not (self.conn and self._query_worker):
             return
         tbl   = self._tbl_var.get()
         cols  = self.table_columns.get(tbl, [])
-        where, params = self._build_where()
+        where, params, match = self._build_where()
+        order = order_clause(cols, *self._sort)
+        sig   = (tbl, order,
+                 json.dumps({k: self._combo_raw(k) for k in COMBO_FILTERS}, sort_keys=True),
+                 tuple(self._like_vars[k].get().strip() for k in LIKE_FILTERS))
+        state = self._refine_state
+        try:
+            key = (db_generation(self.db_path, self.conn),
+                   tbl, where, tuple(params), order)
+        except (OSError, sqlite3.Error):
+            key = None
+        cached = self._result_cache.get(key) if key else None
+        if cached is not None:
+            self._query_worker.cancel()
+            self._show_result(tbl, cols, where, params, match, cached)
+            return
+
+        def done(ids):
+            if key:
+                self._result_cache.put(key, ids)
+            self._show_result(tbl, cols, where, params, match, ids)
+
+        def run(conn, emit):
+            within = live and _refines(state.get("sig"), sig)
+            ids = search_rowids(conn, tbl, where, params, order, emit, within)
+            state["sig"] = None
+            if live and len(ids) <= REFINE_MAX_ROWS:
+                _remember_rowids(conn, ids)
+                state["sig"] = sig
+            return ids
+
+        # 結果は rowid の並びだけ持ち、行の中身は表示する範囲だけ読む (件数 = 長さ)
+        self._set_busy(True)
+        self._query_worker.submit(
+            run, done, self._on_query_error,
+            lambda ids: self._show_result(tbl, cols, where, params, match, ids, partial=True))
+
+    def _show_result(self, tbl: str, cols: list, where: str, params: list, match: str, ids,
+                     partial: bool = False):
+        extends = (not partial and self._showing_partial and tbl == self.current_table
+                   and ids[:len(self.current_ids)] == self.current_ids)
+        self._showing_partial = partial
+        self.current_table  = tbl
         self.current_where  = where
         self.current_params = params
+        self.current_match  = match
+        self.current_ids    = ids
+        if partial:
+            self._total_var.set(f"{len(ids):,}件以上 (件数を集計中...)")
+        else:
+            self._set_busy(False)
+            self._total_var.set(f"{len(ids):,}件")
+            self._status_var.set(f"{len(ids):,}件ヒット")
+        if extends:
+            # 先に出した先頭部分はそのままに、件数だけ伸ばす
+            self._grid.set_count(len(ids))
+            return
+        self.current_visible = [c for c in VISIBLE_COLS.get(tbl, []) if c in cols]
+
+        widths = {"id":50,"chara":60,"mode_name":90,"voice_id":70,
+                  "level_name":70,"filename":200,"file_type":70,
+                  "wav_path":300,"serif":300}
+        self._grid.set_columns(self.current_visible, widths)
+        self._grid.reset(len(self.current_ids))
 
-        # Count
-        cnt = self.conn.execute(
-            f"SELECT COUNT(*) FROM {tbl} {where}", params).fetchone()[0]
-        self._total_var.set(f"{cnt:,}件")
+    def _on_sort(self, col: str):
+        """見出しクリック: 同じ列なら昇順/降順を切り替え、DB に並べ替えを任せて検索し直す。
 
-        # Order column
-        order = next((c for c in ["id","idx","voice_id","filename","rowid"]
-                      if c in cols), "rowid")
+        読み直すのは rowid の並びだけで、行の中身は表示範囲の分しか読まない。
+        """
+        sort_col, desc = self._sort
+        self._sort = (col, not desc) if col == sort_col else (col, False)
+        self._grid.set_sort(*self._sort)
+        self._run_query()
 
-        # すべての結果を取得（ページング無し）
+    def _on_query_error(self, e):
+        self._set_busy(False)
+        self._status_var.set(f"検索に失敗: {e}")
+
+    def _cancel_query(self):
+        if self._query_worker:
+            self._query_worker.cancel()
+        self._set_busy(False)
+        self._status_var.set("検索を中止しました")
+
+    def _set_busy(self, busy: bool):
+        self._cancel_btn.config(state=tk.NORMAL if busy else tk.DISABLED)
+        if busy:
+            self._status_var.set("検索中...")
+
+    def _fetch_rows_by_id(self, ids, cols=None) -> list:
+        """rowid の並びどおりに行 (dict) を返す。消えた行は空 dict。
+
+        cols を渡すとその列だけを読む (表の表示用。詳細・エクスポートは全列)。
+        """
+        if not (self.conn and ids):
+            return [{} for _ in ids]
+        tbl = self.current_table
+        sel = ", ".join(cols) if cols else "*"
         cur = self.conn.execute(
-            f"SELECT * FROM {tbl} {where} ORDER BY {order}", params)
-        self.current_rows    = [dict(r) for r in cur]
-        self.current_visible = [c for c in VISIBLE_COLS.get(tbl, []) if c in cols]
+            f"SELECT rowid, {sel} FROM {tbl} WHERE rowid IN ({','.join('?' * len(ids))})",
+            list(ids))
+        names = [d[0] for d in cur.description][1:]
+        by_id = {r[0]: dict(zip(names, tuple(r)[1:])) for r in cur}
+        return [by_id.get(i, {}) for i in ids]
 
-        self._populate_tree()
+    def _fetch_window(self, start: int, stop: int):
+        if not self.conn:
+            return None
+        return self._fetch_rows_by_id(self.current_ids[start:stop], self.current_visible)
+
+    def _iter_rows(self, positions):
+        """結果中の位置の並びに対応する行を EXPORT_FETCH_ROWS 件ずつ読んで返す。"""
+        it = iter(positions)
+        while True:
+            chunk = [self.current_ids[p] for p in islice(it, EXPORT_FETCH_ROWS)]
+            if not chunk:
+                break
+            yield from (r for r in self._fetch_rows_by_id(chunk) if r)
 
-    def _populate_tree(self):
-        self._tree.delete(*self._tree.get_children())
-        self._tree["columns"] = self.current_visible
-        self._tree["show"]    = "headings"
-        widths = {"id":50,"chara":60,"mode_name":90,"voice_id":70,
-                  "level_name":70,"filename":200,"file_type":70,
-                  "wav_path":300,"serif":300}
-        for c in self.current_visible:
-            w = widths.get(c, 100)
-            self._tree.heading(c, text=c)
-            self._tree.column(c, width=w, minwidth=40, stretch=False)
-        for row in self.current_rows:
-            vals = [str(row.get(c, "")) for c in self.current_visible]
-            self._tree.insert("", "end", values=vals)
-
-    def _on_select(self, _event=None):
-        sel = self._tree.selection()
-        if not sel:
+    def _on_select(self, pos: int):
+        if pos >= len(self.current_ids):
             return
-        idx = self._tree.index(sel[0])
-        if idx >= len(self.current_rows):
+        # 表は表示列しか持たないので、詳細は主キーで 1 行だけ全列を読む
+        rowid = self.current_ids[pos]
+        row = self._fetch_rows_by_id([rowid])[0]
+        if not row:
             return
-        row = self.current_rows[idx]
-        text = "\n".join(f"{k}: {v}" for k, v in row.items())
+        marked = self._highlight_row(rowid)
         self._detail.config(state=tk.NORMAL)
         self._detail.delete("1.0", "end")
-        self._detail.insert("end", text)
+        for i, (k, v) in enumerate(row.items()):
+            self._detail.insert("end", ("\n" if i else "") + f"{k}: ")
+            # \x01 … \x02 で囲まれた部分が MATCH したところ
+            for j, part in enumerate(re.split("[\x01\x02]", str(marked.get(k) or v))):
+                self._detail.insert("end", part, ("hit",) if j % 2 else ())
         self._detail.config(state=tk.DISABLED)
 
+    def _highlight_row(self, rowid: int) -> dict:
+        """現在の MATCH 式で serif / filename をハイライトした値を返す。"""
+        if not (self.conn and self.current_match):
+            return {}
+        hl = ", ".join(f"highlight({FTS_TABLE}, {i}, char(1), char(2))"
+                       for i in range(len(FTS_COLUMNS)))
+        try:
+            r = self.conn.execute(
+                f"SELECT {hl} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? AND rowid = ?",
+                (self.current_match, rowid)).fetchone()
+        except sqlite3.Error:
+            return {}
+        return dict(zip(FTS_COLUMNS, r)) if r else {}
+
     def _select_all_rows(self):
-        self._tree.selection_set(self._tree.get_children())
+        self._grid.select_all()
 
     def _clear_filters(self):
         for v in self._combo_vars.values():
             v.set("")
         for v in self._like_vars.values():
-            v.set("")
+            self._set_filter_quietly(v, "")
+        self._on_filter_edit()   # 件数の更新と (有効なら) 検索を 1 回だけ
 
     # ── Export ──
-    def _get_rows_for_export(self, all_displayed: bool):
+    def _get_positions_for_export(self, all_displayed: bool):
         if all_displayed:
-            return self.current_rows
-        sel = self._tree.selection()
-        idxs = [self._tree.index(s) for s in sel]
-        return [self.current_rows[i] for i in idxs
-                if i < len(self.current_rows)]
-
-    def _build_relative_export_path(self, row: dict) -> Path:
-        tbl   = self._tbl_var.get()
-        chara = sanitize(str(row.get("chara") or ""))
-        mode_name = row.get("mode_name")
-        mode_seg  = sanitize(str(mode_name)) if mode_name \
-                    else f"mode_{row.get('mode','unknown')}"
-        level_name = row.get("level_name")
-        level_seg  = sanitize(str(level_name)) if level_name \
-                     else f"level_{row.get('level','unknown')}"
-        category = (row.get("file_type") or row.get("breath_type") or
-                    row.get("houshi_type") or row.get("aibu_type") or
-                    row.get("situation_type") or "voice")
-        cat_seg  = sanitize(str(category))
-        src = str(row.get("wav_path") or "")
-        ext = Path(src).suffix if Path(src).suffix else ".wav"
-        fn  = sanitize(str(row.get("filename") or f"id_{row.get('id','unknown')}"))
-        return Path(tbl) / chara / mode_seg / level_seg / cat_seg / f"{fn}{ext}"
-
-
-    def _voice_text_row(self, row: dict) -> list:
-        fn    = str(row.get("filename") or "").strip()
-        if not fn:
-            src = str(row.get("wav_path") or "")
-            fn  = Path(src).name if src else f"id_{row.get('id','unknown')}.wav"
-        if not Path(fn).suffix:
-            fn += ".wav"
-        chara = str(row.get("chara") or "").strip() or "unknown"
-        serif = str(row.get("serif") or "")
-        serif = serif.replace("\r\n", "\n").replace("\r", "\n").replace("\n", " ")
-        return [fn, chara, "JP", serif]
+            return range(len(self.current_ids))
+        return self._grid.selected
 
     def _export(self, all_displayed: bool):
-        rows    = self._get_rows_for_export(all_displayed)
+        positions = self._get_positions_for_export(all_displayed)
         exp_dir = self._exp_var.get().strip()
-        tbl     = self._tbl_var.get()
-        if not rows:
+        tbl     = self.current_table
+        if not positions:
             messagebox.showinfo("Info", "エクスポート対象がありません。")
             return
+        if not self.conn:
+            messagebox.showerror("Error", "DB に接続していません。")
+            return
         if not exp_dir:
             messagebox.showerror("Error", "保存先を指定してください。")
             return
 
         filter_parts = [
-            sanitize(self._combo_vars[k].get())
+            sanitize(self._combo_display(k, self._combo_raw(k)))
             for k in COMBO_FILTERS
-            if self._combo_vars[k].get().strip()
+            if self._combo_raw(k)
         ]
         filter_tag = "_".join(filter_parts) if filter_parts else tbl
 
-        dest_root = Path(exp_dir)
-        if self._flat_var.get():
-            dest_root = dest_root / filter_tag
-        dest_root.mkdir(parents=True, exist_ok=True)
-
-        copied = missing = failed = duplicate_skipped = 0
-        voice_text_rows = []
-        seen_sources    = set()
-        seen_dest_paths = set()
-
-        for row in rows:
-            src = row.get("wav_path")
-            if not src:
-                missing += 1
-                continue
-            src_norm = os.path.normcase(os.path.normpath(str(src)))
-            if src_norm in seen_sources:
-                duplicate_skipped += 1
-                continue
-            rel_norm = os.path.normcase(str(self._build_relative_export_path(row)))
-            if rel_norm in seen_dest_paths:
-                duplicate_skipped += 1
-                continue
-            if not os.path.isfile(src):
-                missing += 1
-                continue
-            if self._flat_var.get():
-                src_path = str(row.get("wav_path") or "")
-                ext = Path(src_path).suffix if Path(src_path).suffix else ".wav"
-                fn  = sanitize(str(row.get("filename") or f"id_{row.get('id','unknown')}"))
-                dst = dest_root / f"{fn}{ext}"
-            else:
-                dst = dest_root / self._build_relative_export_path(row)
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            try:
-                shutil.copy2(src, dst)
-                copied += 1
-                seen_sources.add(src_norm)
-                seen_dest_paths.add(rel_norm)
-                voice_text_rows.append(self._voice_text_row(row))
-            except Exception:
-                failed += 1
-
-        if self._save_csv_var.get() and voice_text_rows:
-            stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
-            vtext_path = dest_root / f"voice_text_{filter_tag}_{stamp}.csv"
-            with vtext_path.open("w", newline="", encoding="utf-8-sig") as f:
-                csv.writer(f, delimiter="|", lineterminator="\n").writerows(voice_text_rows)
-
-        msg = (f"保存完了\n対象行: {len(rows)}\n保存成功: {copied}\n"
-               f"重複スキップ: {duplicate_skipped}\nファイルなし: {missing}\n失敗: {failed}")
+        res = export_rows(self._iter_rows(positions), tbl, exp_dir, filter_tag,
+                          flat=self._flat_var.get(), save_csv=self._save_csv_var.get())
+        msg = (f"保存完了\n対象行: {res['rows']}\n保存成功: {res['copied']}\n"
+               f"重複スキップ: {res['duplicate_skipped']}\nファイルなし: {res['missing']}\n"
+               f"失敗: {res['failed']}")
         self._status_var.set(msg.replace("\n", " | "))
         messagebox.showinfo("エクスポート完了", msg)
-        os.startfile(dest_root)
+        os.startfile(res["dest_root"])
 
     # ── History ──
     def _snapshot(self):
@@ -1211,8 +2876,9 @@ class BrowseTab(tk.Frame):
             "db_path":  self._db_var.get(),
             "export_dir": self._exp_var.get(),
             "table":    self._tbl_var.get(),
-            "combo_filters": {k: v.get() for k, v in self._combo_vars.items()},
+            "combo_filters": {k: self._combo_raw(k) for k in COMBO_FILTERS},
             "like_filters":  {k: v.get() for k, v in self._like_vars.items()},
+            "sort":          list(self._sort),
         }
 
     def _apply_snapshot(self, snap):
@@ -1227,11 +2893,14 @@ class BrowseTab(tk.Frame):
         for k, v in snap.get("combo_filters", {}).items():
             if k in self._combo_vars:
                 if k == "chara" and v:
-                    v = self._char_display_map.get(v, v)
-                self._combo_vars[k].set(v)
+                    v = v.split()[0]   # 旧形式の "c13 ギャル" も受け付ける
+                self._combo_vars[k].set(self._combo_label(k, v))
         for k, v in snap.get("like_filters", {}).items():
             if k in self._like_vars:
-                self._like_vars[k].set(v)
+                self._set_filter_quietly(self._like_vars[k], v)
+        sort_col, desc = snap.get("sort") or (None, False)
+        self._sort = (sort_col, bool(desc))
+        self._grid.set_sort(*self._sort)
 
     def _save_last(self):
         self.app_state["last"] = self._snapshot()
@@ -1255,7 +2924,8 @@ class BrowseTab(tk.Frame):
 
     def set_char_map(self, char_map: dict):
         self._char_display_map = char_map
-        self._load_distinct_values()
+        self._apply_facet_counts({})
+        self._schedule_facets()
 
     def _write_state(self):
         try:
@@ -1364,10 +3034,13 @@ class KksVoiceStudio(tk.Tk):
         nb = ttk.Notebook(self)
         nb.pack(fill="both", expand=True)
 
-        self._tab_extract = ExtractTab(nb, on_kks_change=self._on_kks_change)
+        self._tab_extract = ExtractTab(nb, on_kks_change=self._on_kks_change,
+                                       get_db_path=lambda: self._tab_build._db_var.get(),
+                                       on_db_ready=self._on_build_done)
         self._tab_browse  = BrowseTab(nb)
         self._tab_build   = BuildDbTab(nb, on_build_done=self._on_build_done,
-                                       get_kks_dir=lambda: self._tab_extract._kks_var.get())
+                                       get_kks_dir=lambda: self._tab_extract._kks_var.get(),
+                                       before_swap=self._tab_browse.disconnect)
 
         nb.add(self._tab_extract, text="  抽出  ")
         nb.add(self._tab_build,   text="  DB構築  ")
@@ -1431,14 +3104,226 @@ class KksVoiceStudio(tk.Tk):
         except Exception:
             pass
         try:
-            if self._tab_browse.conn:
-                self._tab_browse.conn.close()
+            self._tab_browse.disconnect()
         except Exception:
             pass
         super().destroy()
 
 
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+EXIT_OK          = 0
+EXIT_ERROR       = 1   # 例外 / 処理中のエラーあり
+EXIT_USAGE       = 2   # 引数エラー (argparse と同じ)
+EXIT_INTERRUPTED = 130
+
+
+def _split_csv_arg(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+
+def _parse_filter_args(items, allowed, parser, opt):
+    result = {}
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        if not sep or key not in allowed:
+            parser.error(f"{opt} は {'/'.join(allowed)} のいずれかを col=value で指定してください: {item}")
+        result[key] = value
+    return result
+
+
+def _cli_log_fn(json_mode: bool, started: float):
+    """進捗ログを stderr に出す。json_mode では 1 行 1 JSON オブジェクト。"""
+    def log(text: str):
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if json_mode:
+                line = json.dumps({"event": "log",
+                                   "elapsed": round(time.monotonic() - started, 3),
+                                   "message": line}, ensure_ascii=False)
+            print(line, file=sys.stderr, flush=True)
+    return log
+
+
+def _cli_query(args, parser):
+    """--db / --table / --where / --like から (conn, tbl, cols, where, params) を作る。"""
+    if not Path(args.db).is_file():
+        parser.error(f"DBが見つかりません: {args.db}")
+    combo = _parse_filter_args(args.where, COMBO_FILTERS, parser, "--where")
+    like  = _parse_filter_args(args.like,  LIKE_FILTERS,  parser, "--like")
+    conn  = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    cols  = _table_columns(conn).get(args.table)
+    if cols is None:
+        conn.close()
+        parser.error(f"テーブルがありません: {args.table}")
+    where, params = build_where(cols, combo, like, _db_normalized(conn),
+                                _fts_table(conn, args.table))
+    return conn, args.table, cols, where, params
+
+
+def _cli_order(args, cols, parser) -> str:
+    if args.sort and args.sort not in cols:
+        parser.error(f"--sort の列がありません: {args.sort}")
+    return order_clause(cols, args.sort, args.desc)
+
+
+def _iter_query_rows(conn, tbl, where, params, order, limit=None):
+    sql = f"SELECT * FROM {tbl} {where} ORDER BY {order}"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    for r in conn.execute(sql, params):
+        yield dict(r)
+
+
+def _build_cli_parser():
+    parser = argparse.ArgumentParser(
+        prog="kks_voice_studio",
+        description="KKS Voice Studio (引数なしで GUI を起動)")
+    parser.add_argument("--json", action="store_true",
+                        help="進捗ログを JSON Lines で stderr に出力")
+    # サブコマンドの後ろに書いた --json も受け付ける (SUPPRESS なので前に書いた値を消さない)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", default=argparse.SUPPRESS,
+                        help="進捗ログを JSON Lines で stderr に出力")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("extract", help="AssetBundle から WAV を抽出", parents=[common])
+    p.add_argument("--kks", required=True, help="KKSインストールフォルダ")
+    p.add_argument("--out", help="WAV出力先 (既定: {kks}/wave)")
+    p.add_argument("--chars", help="カンマ区切りのキャラ (既定: 全キャラ)")
+    p.add_argument("--types", help="カンマ区切りの型コード (例: so,hh)")
+    p.add_argument("--levels", help="カンマ区切りのレベル (例: 02,03)")
+    p.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="並列プロセス数")
+    p.add_argument("--full", action="store_true", help="マニフェストを無視して全バンドルを処理")
+    p.add_argument("--index-db", help="抽出と同時に WAV を登録する DB")
+
+    p = sub.add_parser("build", help="抽出済み WAV から DB を構築", parents=[common])
+    p.add_argument("--wav", required=True, help="WAVフォルダ")
+    p.add_argument("--db", help="DB出力先 (既定: {wav}/kks_voices.db)")
+    p.add_argument("--kks", default="", help="KKSフォルダ (型データ・セリフCSV用)")
+    p.add_argument("--incremental", action="store_true",
+                   help="既存 DB との差分 (追加・変更・削除) だけを反映")
+
+    for name, help_text in (("query", "DB を検索して行を JSON Lines で出力"),
+                            ("export", "DB の検索結果を WAV として保存")):
+        p = sub.add_parser(name, help=help_text, parents=[common])
+        p.add_argument("--db", required=True, help="SQLite DB")
+        p.add_argument("--table", default="voices")
+        p.add_argument("--where", action="append", metavar="COL=VALUE",
+                       help=f"完全一致フィルタ ({', '.join(COMBO_FILTERS)})")
+        p.add_argument("--like", action="append", metavar="COL=TEXT",
+                       help=f"部分一致フィルタ ({', '.join(LIKE_FILTERS)})")
+        p.add_argument("--sort", metavar="COL", help="並べ替える列 (同じ値は rowid 順)")
+        p.add_argument("--desc", action="store_true", help="--sort を降順にする")
+        if name == "query":
+            p.add_argument("--limit", type=int, help="最大件数")
+            p.add_argument("--explain", action="store_true",
+                           help="行の代わりに EXPLAIN QUERY PLAN を出力")
+        else:
+            p.add_argument("--dest", required=True, help="保存先フォルダ")
+            p.add_argument("--flat", action="store_true", help="1フォルダにまとめて保存")
+            p.add_argument("--no-csv", action="store_true", help="voice_text CSV を出力しない")
+    return parser
+
+
+def run_cli(argv) -> int:
+    """サブコマンドを実行して終了コードを返す。結果は stdout に JSON で出す。"""
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.reconfigure(encoding="utf-8")
+        except (AttributeError, ValueError):
+            pass
+    parser  = _build_cli_parser()
+    args    = parser.parse_args(argv)
+    started = time.monotonic()
+    log_fn  = _cli_log_fn(args.json, started)
+    code    = EXIT_OK
+    try:
+        if args.command == "extract":
+            if not UNITYPY_OK:
+                log_fn("[ERROR] UnityPy が見つかりません (pip install UnityPy)\n")
+                return EXIT_ERROR
+            chars = _split_csv_arg(args.chars) or ALL_CHARS
+            bad = [c for c in chars if c not in ALL_CHARS]
+            if bad:
+                parser.error(f"不明なキャラ: {', '.join(bad)}")
+            # 型コードは小文字、レベルは 2 桁 (FILENAME_RE の表記) にそろえる
+            types  = [t.lower() for t in _split_csv_arg(args.types) or []] or None
+            levels = [l.zfill(2) for l in _split_csv_arg(args.levels) or []] or None
+            bad = [t for t in types or [] if t not in TYPE_INFO]
+            if bad:
+                parser.error(f"不明な型コード: {', '.join(bad)} ({', '.join(TYPE_INFO)})")
+            bad = [l for l in levels or [] if l not in LEVEL_NAME]
+            if bad:
+                parser.error(f"不明なレベル: {', '.join(bad)} ({', '.join(LEVEL_NAME)})")
+            indexer = VoiceIndexer(args.index_db, args.kks, log_fn) if args.index_db else None
+            try:
+                result = extract_voices(
+                    args.kks, args.out or str(Path(args.kks) / "wave"), chars, log_fn,
+                    workers=max(1, args.workers), use_manifest=not args.full,
+                    type_codes=types, levels=levels,
+                    on_clip=indexer.add if indexer else None)
+            finally:
+                index_stats = indexer.close() if indexer else None
+            if index_stats:
+                result["index"] = index_stats
+            if result["errors"]:
+                code = EXIT_ERROR
+        elif args.command == "build":
+            result = build_voice_db(args.wav, args.db or args.wav, args.kks, log_fn,
+                                    incremental=args.incremental)
+        elif args.command == "query":
+            conn, tbl, cols, where, params = _cli_query(args, parser)
+            order = _cli_order(args, cols, parser)
+            if args.explain:
+                sql = f"SELECT * FROM {tbl} {where} ORDER BY {order}"
+                for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+                    print(json.dumps({"sql": sql, "detail": r["detail"]}, ensure_ascii=False))
+                conn.close()
+                return EXIT_OK
+            try:
+                n = 0
+                for row in _iter_query_rows(conn, tbl, where, params, order, args.limit):
+                    print(json.dumps(row, ensure_ascii=False))
+                    n += 1
+            finally:
+                conn.close()
+            result = {"table": tbl, "rows": n}
+        else:
+            conn, tbl, cols, where, params = _cli_query(args, parser)
+            order = _cli_order(args, cols, parser)
+            combo = _parse_filter_args(args.where, COMBO_FILTERS, parser, "--where")
+            filter_tag = "_".join(sanitize(v) for v in combo.values() if v.strip()) or tbl
+            try:
+                result = export_rows(_iter_query_rows(conn, tbl, where, params, order),
+                                     tbl, args.dest, filter_tag,
+                                     flat=args.flat, save_csv=not args.no_csv)
+            finally:
+                conn.close()
+            log_fn(f"[export] {result['copied']} / {result['rows']} 件保存\n")
+            if result["failed"]:
+                code = EXIT_ERROR
+    except KeyboardInterrupt:
+        log_fn("[停止しました]\n")
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        log_fn(f"[ERROR] {e}\n")
+        return EXIT_ERROR
+    if args.command != "query":
+        print(json.dumps(dict(result, event="result", command=args.command,
+                              elapsed=round(time.monotonic() - started, 3)),
+                         ensure_ascii=False), flush=True)
+    else:
+        log_fn(f"[query] {result['rows']} 件\n")
+    return code
+
+
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     app = KksVoiceStudio()
     app.mainloop()
 
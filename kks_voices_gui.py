@@ -8,6 +8,8 @@ import tkinter as tk
 from pathlib import Path
 from tkinter import filedialog, messagebox, ttk
 
+from kks_result_set import ResultSet
+
 
 DEFAULT_DB_PATH = ""
 DEFAULT_EXPORT_DIR = str(Path.home() / "kks_voice_export")
@@ -69,6 +71,10 @@ FILTER_COMBO_COLUMNS = [
     "breath_type",
 ]
 FILTER_LIKE_COLUMNS = ["filename", "serif", "wav_path"]
+# kks_voice_studio が作る DB は PRAGMA user_version >= 2 ならフィルタ列が TRIM 済み
+NORMALIZED_SCHEMA_VERSION = 2
+# クエリ条件ごとに保持する総件数・ページ境界キーの上限
+PAGE_CACHE_MAX = 32
 
 
 def sanitize_segment(value):
@@ -102,13 +108,20 @@ class KksVoiceDbGui(tk.Tk):
 
         self.combo_filter_vars = {col: tk.StringVar(value="") for col in FILTER_COMBO_COLUMNS}
         self.like_filter_vars = {col: tk.StringVar(value="") for col in FILTER_LIKE_COLUMNS}
+        # コンボボックスの表示ラベル ("value (123)") → DB の値
+        self.combo_value_maps = {col: {} for col in FILTER_COMBO_COLUMNS}
 
         self.conn = None
+        self.db_path = ""
         self.table_columns = {}
+        self.normalized = False
         self.current_rows = []
         self.current_visible_columns = []
         self.current_where_sql = ""
         self.current_where_params = []
+        self.page_cache = {}
+        self.sort_column = None
+        self.sort_desc = False
         self.history_window = None
         self.history_listbox = None
         self.app_state = {"last": None, "history": []}
@@ -149,8 +162,14 @@ class KksVoiceDbGui(tk.Tk):
         ttk.Button(frame_ctrl, text="履歴", command=self._open_history_window).grid(row=0, column=5, padx=2)
         ttk.Button(frame_ctrl, text="前へ", command=self._prev_page).grid(row=0, column=6, padx=2)
         ttk.Button(frame_ctrl, text="次へ", command=self._next_page).grid(row=0, column=7, padx=2)
-        self.page_label = ttk.Label(frame_ctrl, text="Page 1 / 1")
-        self.page_label.grid(row=0, column=8, sticky="w", padx=(8, 0))
+        frame_page = ttk.Frame(frame_ctrl)
+        frame_page.grid(row=0, column=8, sticky="w", padx=(8, 0))
+        page_spin = ttk.Spinbox(frame_page, from_=1, to=999999, textvariable=self.page_var, width=7)
+        page_spin.pack(side="left")
+        page_spin.bind("<Return>", lambda _e: self._jump_page())
+        ttk.Button(frame_page, text="移動", command=self._jump_page, width=5).pack(side="left", padx=2)
+        self.page_label = ttk.Label(frame_page, text="Page 1 / 1")
+        self.page_label.pack(side="left", padx=(6, 0))
 
         self.total_label = ttk.Label(frame_ctrl, text="Total: 0")
         self.total_label.grid(row=0, column=9, sticky="e")
@@ -271,6 +290,10 @@ class KksVoiceDbGui(tk.Tk):
                 self.conn.close()
             self.conn = sqlite3.connect(db_path)
             self.conn.row_factory = sqlite3.Row
+            self.db_path = db_path
+            self.page_cache = {}
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            self.normalized = version >= NORMALIZED_SCHEMA_VERSION
             self._load_table_columns()
             self._setup_table_list()
             self._on_table_changed()
@@ -290,7 +313,11 @@ class KksVoiceDbGui(tk.Tk):
             self.table_columns[table] = cols
 
     def _setup_table_list(self):
-        tables = [t for t in self.table_columns.keys() if t != "sqlite_sequence"]
+        # sqlite_*・全文検索 (voices_fts とその影表)・facets は内部用なので出さない
+        tables = [
+            t for t in self.table_columns.keys()
+            if not t.startswith("sqlite_") and not t.startswith("voices_fts") and t != "facets"
+        ]
         if not tables:
             raise RuntimeError("テーブルが見つかりません。")
         self.table_combo["values"] = tables
@@ -325,7 +352,7 @@ class KksVoiceDbGui(tk.Tk):
             "export_dir": self.export_dir_var.get().strip(),
             "table": self.table_var.get().strip(),
             "page_size": page_size,
-            "combo_filters": {k: self.combo_filter_vars[k].get().strip() for k in FILTER_COMBO_COLUMNS},
+            "combo_filters": {k: self._combo_raw_value(k) for k in FILTER_COMBO_COLUMNS},
             "like_filters": {k: self.like_filter_vars[k].get().strip() for k in FILTER_LIKE_COLUMNS},
         }
         return snapshot
@@ -354,7 +381,7 @@ class KksVoiceDbGui(tk.Tk):
         like_filters = snapshot.get("like_filters", {}) or {}
 
         for k in FILTER_COMBO_COLUMNS:
-            self.combo_filter_vars[k].set(str(combo_filters.get(k, "")).strip())
+            self.combo_filter_vars[k].set(self._combo_label(k, str(combo_filters.get(k, "")).strip()))
         for k in FILTER_LIKE_COLUMNS:
             self.like_filter_vars[k].set(str(like_filters.get(k, "")).strip())
 
@@ -565,35 +592,74 @@ class KksVoiceDbGui(tk.Tk):
                 self.like_filter_vars[col].set("")
                 w.configure(state="disabled")
 
-    def _load_distinct_filter_values(self):
-        table = self.table_var.get()
-        columns = set(self.table_columns.get(table, []))
+    def _load_facet_counts(self, table, columns):
+        """{列: [(値, 件数), ...]}。kks_voice_studio が作る facets 表があればそれを使う。"""
+        has_facets = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='facets'"
+        ).fetchone()
+        if has_facets:
+            facets = {col: [] for col in FILTER_COMBO_COLUMNS if col in columns}
+            rows = self.conn.execute(
+                "SELECT column_name, value, row_count FROM facets WHERE table_name = ? ORDER BY value",
+                (table,),
+            ).fetchall()
+            for r in rows:
+                if r["column_name"] in facets:
+                    facets[r["column_name"]].append((r["value"], r["row_count"]))
+            if any(facets.values()):
+                return facets
+
+        facets = {}
         for col in FILTER_COMBO_COLUMNS:
-            widget = self.filter_widgets.get(col)
-            if widget is None:
-                continue
             if col not in columns:
-                widget["values"] = []
                 continue
             sql = (
-                f"SELECT DISTINCT {col} AS value "
+                f"SELECT {col} AS value, COUNT(*) AS c "
                 f"FROM {table} "
                 f"WHERE {col} IS NOT NULL AND {col} <> '' "
-                f"ORDER BY {col} LIMIT 5000"
+                f"GROUP BY {col} ORDER BY {col} LIMIT 5000"
             )
-            raw_values = [r["value"] for r in self.conn.execute(sql).fetchall()]
-            values = []
-            seen = set()
-            for raw in raw_values:
-                text = str(raw).strip()
+            counts = {}
+            labels = {}
+            for r in self.conn.execute(sql).fetchall():
+                text = str(r["value"]).strip()
                 if not text:
                     continue
                 key = text.casefold()
-                if key in seen:
-                    continue
-                seen.add(key)
-                values.append(text)
-            widget["values"] = [""] + values
+                labels.setdefault(key, text)
+                counts[key] = counts.get(key, 0) + r["c"]
+            facets[col] = [(labels[key], counts[key]) for key in labels]
+        return facets
+
+    def _load_distinct_filter_values(self):
+        table = self.table_var.get()
+        columns = set(self.table_columns.get(table, []))
+        facets = self._load_facet_counts(table, columns)
+        for col in FILTER_COMBO_COLUMNS:
+            widget = self.filter_widgets.get(col)
+            if widget is None:
+                continue
+            if col not in columns:
+                widget["values"] = []
+                self.combo_value_maps[col] = {}
+                continue
+            raw = self._combo_raw_value(col)
+            labels = {f"{value} ({count:,})": value for value, count in facets.get(col, [])}
+            self.combo_value_maps[col] = labels
+            widget["values"] = [""] + list(labels)
+            self.combo_filter_vars[col].set(self._combo_label(col, raw))
+
+    def _combo_raw_value(self, col):
+        text = self.combo_filter_vars[col].get().strip()
+        return self.combo_value_maps[col].get(text, text)
+
+    def _combo_label(self, col, raw):
+        if not raw:
+            return ""
+        for label, value in self.combo_value_maps[col].items():
+            if value == raw:
+                return label
+        return raw
 
     def _build_where(self):
         table = self.table_var.get()
@@ -603,9 +669,13 @@ class KksVoiceDbGui(tk.Tk):
         params = []
 
         for col in FILTER_COMBO_COLUMNS:
-            val = self.combo_filter_vars[col].get().strip()
+            val = self._combo_raw_value(col)
             if val and col in columns:
-                conditions.append(f"TRIM(COALESCE({col}, '')) = ?")
+                if self.normalized:
+                    # 素の = 比較ならインデックスが効く
+                    conditions.append(f"{col} = ?")
+                else:
+                    conditions.append(f"TRIM(COALESCE({col}, '')) = ?")
                 params.append(val)
 
         for col in FILTER_LIKE_COLUMNS:
@@ -621,6 +691,8 @@ class KksVoiceDbGui(tk.Tk):
 
     def _resolve_order_column(self, table):
         cols = self.table_columns.get(table, [])
+        if self.sort_column in cols:
+            return self.sort_column
         for c in ["id", "idx", "voice_id", "filename"]:
             if c in cols:
                 return c
@@ -655,28 +727,109 @@ class KksVoiceDbGui(tk.Tk):
         self.current_where_sql = where_sql
         self.current_where_params = list(params)
 
-        count_sql = f"SELECT COUNT(*) AS c FROM {table}{where_sql}"
-        total = self.conn.execute(count_sql, params).fetchone()["c"]
+        order_col = self._resolve_order_column(table)
+        desc = self.sort_desc and order_col == self.sort_column
+        index = self._page_index(table, where_sql, params, order_col, desc, page_size)
+        total = index["total"]
         self.total_rows_var.set(total)
 
         max_page = max(1, (total + page_size - 1) // page_size)
-        current_page = min(max(1, int(self.page_var.get())), max_page)
+        try:
+            requested_page = int(self.page_var.get())
+        except Exception:
+            requested_page = 1
+        current_page = min(max(1, requested_page), max_page)
         self.page_var.set(current_page)
 
-        offset = (current_page - 1) * page_size
-        order_col = self._resolve_order_column(table)
-        sql = f"SELECT * FROM {table}{where_sql} ORDER BY {order_col} LIMIT ? OFFSET ?"
-        query_params = list(params) + [page_size, offset]
-
-        rows = self.conn.execute(sql, query_params).fetchall()
-        self.current_rows = [dict(r) for r in rows]
+        key_sql = index["key_sql"]
+        bounds = index["bounds"]
+        if bounds is None:
+            # 並び順の列に NULL があると行値で比較できないので OFFSET で読む
+            offset = (current_page - 1) * page_size
+            sql = f"SELECT * FROM {table}{where_sql} ORDER BY {key_sql} LIMIT ? OFFSET ?"
+            query_params = list(params) + [page_size, offset]
+        elif bounds[current_page - 1] is None:
+            sql = f"SELECT * FROM {table}{where_sql} ORDER BY {key_sql} LIMIT ?"
+            query_params = list(params) + [page_size]
+        else:
+            # 前ページ最終行のキーより後ろをシークする (何ページ目でも同じコスト)
+            bound = bounds[current_page - 1]
+            op = "<" if desc else ">"
+            seek = f"({index['key_cols']}) {op} ({', '.join('?' * len(bound))})"
+            seek_where = f"{where_sql} AND {seek}" if where_sql else f" WHERE {seek}"
+            sql = f"SELECT * FROM {table}{seek_where} ORDER BY {key_sql} LIMIT ?"
+            query_params = list(params) + list(bound) + [page_size]
+
+        # 行ごとの dict ではなく列ごとに詰めて持つ (行は dict のように読める)
+        self.current_rows = ResultSet.from_cursor(self.conn.execute(sql, query_params))
         self.current_visible_columns = self._resolve_visible_columns(table)
 
         self._populate_tree()
 
         self.page_label.configure(text=f"Page {current_page} / {max_page}")
         self.total_label.configure(text=f"Total: {total}")
-        self.status_var.set(f"Loaded {len(rows)} rows from {table} (matched: {total})")
+        self.status_var.set(f"Loaded {len(self.current_rows)} rows from {table} (matched: {total})")
+
+    def _is_rowid_alias(self, table, col):
+        if col == "rowid":
+            return True
+        pks = [r for r in self.conn.execute(f"PRAGMA table_info({table})").fetchall() if r["pk"]]
+        return len(pks) == 1 and pks[0]["name"] == col and str(pks[0]["type"]).upper() == "INTEGER"
+
+    def _db_generation(self):
+        # DB の中身が変わると変わる値 (再構築はファイルの mtime/サイズ、他の接続の書き込みは data_version)
+        try:
+            st = os.stat(self.db_path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        return stamp, self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _page_index(self, table, where_sql, params, order_col, desc, page_size):
+        """クエリ条件ごとの総件数と各ページ先頭の直前キー。
+
+        初回だけキー列 (並び順の列 + rowid) を 1 回なめて数え、page_size 行ごとの
+        境界キーを覚える。以後のページ移動はキーからのシーク 1 回で済む。
+        降順では rowid も降順にして、(列, rowid) のインデックスを後ろからなめる。
+        """
+        signature = (self._db_generation(), table, where_sql, tuple(params), order_col, desc, page_size)
+        cached = self.page_cache.get(signature)
+        if cached is not None:
+            return cached
+
+        rowid_only = self._is_rowid_alias(table, order_col)
+        key_cols = "rowid" if rowid_only else f"{order_col}, rowid"
+        direction = " DESC" if desc else ""
+        key_sql = "rowid" + direction if rowid_only else f"{order_col}{direction}, rowid{direction}"
+        total = 0
+        bounds = [None]
+        keyset = True
+        cur = self.conn.execute(f"SELECT {key_cols} FROM {table}{where_sql} ORDER BY {key_sql}", params)
+        for row in cur:
+            total += 1
+            if row[0] is None:
+                keyset = False
+            if total % page_size == 0:
+                bounds.append(tuple(row))
+
+        index = {"total": total, "bounds": bounds if keyset else None,
+                 "key_sql": key_sql, "key_cols": key_cols}
+        if len(self.page_cache) >= PAGE_CACHE_MAX:
+            self.page_cache.pop(next(iter(self.page_cache)))
+        self.page_cache[signature] = index
+        return index
+
+    def _jump_page(self):
+        self._run_query(reset_page=False)
+
+    def _sort_by(self, col):
+        # 見出しクリック: 同じ列なら昇順/降順を切り替え、DB の ORDER BY で読み直す
+        if col == self.sort_column:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_column = col
+            self.sort_desc = False
+        self._run_query(reset_page=True)
 
     def _populate_tree(self):
         self.tree.delete(*self.tree.get_children())
@@ -685,7 +838,10 @@ class KksVoiceDbGui(tk.Tk):
         self.tree["columns"] = cols
 
         for c in cols:
-            self.tree.heading(c, text=c)
+            mark = ""
+            if c == self.sort_column:
+                mark = " ▼" if self.sort_desc else " ▲"
+            self.tree.heading(c, text=c + mark, command=lambda c=c: self._sort_by(c))
             width = 120
             if c in ("serif", "wav_path"):
                 width = 480
@@ -0,0 +1,61 @@
+"""build_voice_db で作った DB の検索がインデックスを使うかを EXPLAIN QUERY PLAN で確かめる。"""
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import kks_voice_studio as kvs  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    root = tmp_path_factory.mktemp("kks")
+    wav_dir = root / "wave"
+    for chara in ("c00", "c13"):
+        d = wav_dir / chara
+        d.mkdir(parents=True)
+        for type_code in ("so", "hh", "ai"):
+            for level in ("00", "03"):
+                for seq in range(3):
+                    (d / f"h_{type_code}_{chara[1:]}_{level}_{seq:03d}.wav").write_bytes(b"RIFF")
+    db_path = str(root / "kks_voices.db")
+    result = kvs.build_voice_db(str(wav_dir), db_path, "", lambda text: None)
+    assert result["voices"] > 0
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+def _plan(conn, where: str, params: list) -> str:
+    rows = conn.execute(f"EXPLAIN QUERY PLAN SELECT rowid FROM voices {where}", params)
+    return " / ".join(r["detail"] for r in rows)
+
+
+def _voice_columns(conn) -> list:
+    return kvs._table_columns(conn)["voices"]
+
+
+def test_build_where_has_no_trim(conn):
+    combo = {"chara": "c13", "mode_name": "sonyu", "level_name": "絶頂", "file_type": "sonyu"}
+    where, _ = kvs.build_where(_voice_columns(conn), combo, {}, kvs._db_normalized(conn))
+    assert where
+    assert "TRIM(" not in where.upper()
+
+
+def test_chara_mode_level_uses_composite_index(conn):
+    combo = {"chara": "c13", "mode_name": "sonyu", "level_name": "絶頂"}
+    where, params = kvs.build_where(_voice_columns(conn), combo, {}, kvs._db_normalized(conn))
+    assert "idx_voices_chara_mode_level" in _plan(conn, where, params)
+
+
+def test_file_type_sorted_by_voice_id_uses_composite_index(conn):
+    # 種別で絞って voice_id の見出しで並べ替えたときのブラウズの検索
+    cols = _voice_columns(conn)
+    where, params = kvs.build_where(cols, {"file_type": "sonyu"}, {}, kvs._db_normalized(conn))
+    order = kvs.order_clause(cols, "voice_id")
+    plan = _plan(conn, f"{where} ORDER BY {order}", params)
+    assert "idx_voices_type_voice" in plan
+    assert "TEMP B-TREE" not in plan
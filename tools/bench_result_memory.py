@@ -0,0 +1,67 @@
+"""
+ResultSet のメモリ比較 (開発用)
+-------------------------------
+同じ行を list[dict] と ResultSet で持ったときの確保メモリ (tracemalloc) と時間を比べる。
+
+    python tools/bench_result_memory.py --db C:/KKS/wave/kks_voices.db --limit 100000
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from kks_result_set import ResultSet  # noqa: E402
+
+
+def benchmark_result_memory(conn, tbl: str, limit: int = None) -> dict:
+    """同じ行を list[dict] と ResultSet で持ったときの確保メモリ (tracemalloc) を比べる。"""
+    sql = f"SELECT * FROM {tbl}" + (f" LIMIT {int(limit)}" if limit else "")
+    out = {"table": tbl}
+    for name, load in (("dicts", lambda cur: [dict(zip([d[0] for d in cur.description], r))
+                                              for r in cur]),
+                       ("result_set", ResultSet.from_cursor)):
+        cur = conn.execute(sql)
+        tracemalloc.start()
+        try:
+            t0   = time.perf_counter()
+            held = load(cur)
+            out[f"{name}_bytes"], _ = tracemalloc.get_traced_memory()
+            out[f"{name}_seconds"]  = round(time.perf_counter() - t0, 3)
+        finally:
+            tracemalloc.stop()
+        out["rows"] = len(held)
+        del held
+    out["ratio"] = round(out["result_set_bytes"] / max(out["dicts_bytes"], 1), 3)
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="list[dict] と ResultSet のメモリを比較")
+    parser.add_argument("--db", required=True, help="SQLite DB")
+    parser.add_argument("--table", default="voices")
+    parser.add_argument("--limit", type=int, help="読む行数 (既定: 全件)")
+    args = parser.parse_args(argv)
+    if not Path(args.db).is_file():
+        parser.error(f"DBが見つかりません: {args.db}")
+    conn = sqlite3.connect(args.db)
+    try:
+        found = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                             (args.table,)).fetchone()
+        if not found:
+            parser.error(f"テーブルがありません: {args.table}")
+        result = benchmark_result_memory(conn, args.table, args.limit)
+    finally:
+        conn.close()
+    print(f"[bench] {result['rows']:,} 行: list[dict] {result['dicts_bytes']:,} B / "
+          f"ResultSet {result['result_set_bytes']:,} B ({result['ratio']:.0%})", file=sys.stderr)
+    print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())